@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+python -m benchmarks [-s SCENARIO ...] [-o results.json]
+python -m benchmarks --compare old.json new.json
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import sys
+
+from benchmarks import suite
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # The options of this run only, the others are passed on to the isolated runs
+    run_options = argparse.ArgumentParser(add_help=False)
+    run_options.add_argument('-s', '--scenario', action='append',
+                             choices=sorted(suite.SCENARIOS),
+                             help='Scenario to run, can be repeated (default: all)')
+    run_options.add_argument('-o', '--output', metavar='<file>',
+                             help='Write results to <file> instead of stdout')
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=suite.__doc__, parents=[run_options],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help='Corpus sizes in characters')
+    parser.add_argument('--configs', nargs='+',
+                        help='Conversions for the convert scenario')
+    parser.add_argument('--chapters', type=int, default=50,
+                        help='Chapters in the fake book for the plugin scenario')
+    parser.add_argument('--chapter-size', type=int, default=20000,
+                        help='Characters per chapter for the plugin scenario')
+    parser.add_argument('--entries', type=int, default=40000,
+                        help='User dictionary entries for the custom_trie scenario')
+    parser.add_argument('--compare', nargs=2, metavar=('<old>', '<new>'),
+                        help='Compare two result files instead of running')
+    parser.add_argument('--in-process', metavar='<scenario>', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        results = []
+        for path in args.compare:
+            with io.open(path, encoding='utf-8') as f:
+                results.append(json.load(f))
+        for name, (old, new, ratio) in sorted(suite.compare(*results).items()):
+            print('%-60s %14.6g %14.6g %8s' % (
+                name, old, new, '%.3fx' % ratio if ratio is not None else '-'))
+        return 0
+
+    if args.in_process:
+        print(json.dumps(suite.run_scenario(args.in_process, args)))
+        return 0
+
+    # Pass the other options on to the isolated runs as given
+    _, forwarded = run_options.parse_known_args(argv)
+    report = {'environment': suite.environment(), 'scenarios': {}}
+    for name in args.scenario or sorted(suite.SCENARIOS):
+        print('running %s...' % name, file=sys.stderr)
+        report['scenarios'][name] = suite.run_isolated(name, forwarded)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Memory and throughput of user dictionary tries: the nested-dict trie that
+UltraConverter used to build, against opencc.CompactTrie matched inside the
+first OpenCC dictionary group.
+
+    python -m benchmarks.custom_trie [--entries N] [--chars N] [--repeat N]
+
+Times are the best of --repeat runs.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from opencc import CompactTrie, OpenCC  # noqa: E402
+
+STPHRASES = os.path.join(ROOT, 'opencc', 'dictionary', 'STPhrases.txt')
+
+
+def build_nested_trie(final_dict):
+    trie = {}
+    for key, val in final_dict.items():
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node['VALUE'] = val
+    return trie
+
+
+def nested_trie_replace(trie, text):
+    res = []
+    i = 0
+    length = len(text)
+    while i < length:
+        best_match_val = None
+        best_match_len = 0
+        curr_node = trie
+        for j in range(i, length):
+            char = text[j]
+            if char not in curr_node:
+                break
+            curr_node = curr_node[char]
+            if 'VALUE' in curr_node:
+                best_match_val = curr_node['VALUE']
+                best_match_len = j - i + 1
+        if best_match_val is not None:
+            res.append(best_match_val)
+            i += best_match_len
+        else:
+            res.append(text[i])
+            i += 1
+    return "".join(res)
+
+
+def best_time(func, repeat):
+    """
+    :return: the shortest time func takes over repeat runs
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(build, repeat=1):
+    """
+    :return: result, build time, and memory held by the result when traced
+    """
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    elapsed = best_time(build, repeat)
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def make_inputs(entries, chars, seed=1):
+    rng = random.Random(seed)
+    with io.open(STPHRASES, encoding='utf-8') as f:
+        pairs = [line.rstrip('\n').split('\t') for line in f]
+    rng.shuffle(pairs)
+    custom = dict((key, value.split(' ')[0]) for key, value in pairs[:entries])
+    keys = list(custom)
+    pieces = []
+    total = 0
+    while total < chars:
+        piece = rng.choice(keys) if rng.random() < 0.3 else rng.choice(pairs)[0]
+        pieces.append(piece)
+        pieces.append(rng.choice(['', '', '，', '。']))
+        total += len(piece)
+    return custom, "".join(pieces)
+
+
+def run(entries, chars, repeat=3):
+    custom, text = make_inputs(entries, chars)
+    # Converted keys, as run() used to build them for the nested trie
+    cc = OpenCC('s2t')
+    start = time.perf_counter()
+    converted_custom = dict((cc.convert(key), value) for key, value in custom.items())
+    key_conversion = time.perf_counter() - start
+
+    nested, nested_build, nested_mem = measure(lambda: build_nested_trie(converted_custom), repeat)
+    _, compact_build, compact_mem = measure(lambda: CompactTrie(custom), repeat)
+    cc_custom = OpenCC('s2t', custom_dicts=[custom])
+    cc_custom.convert('')
+
+    # Previous pipeline: OpenCC pass, then a separate trie pass
+    nested_match = best_time(lambda: nested_trie_replace(nested, cc.convert(text)), repeat)
+    # Custom tries matched in the same pass as the first OpenCC group
+    compact_match = best_time(lambda: cc_custom.convert(text), repeat)
+
+    return {
+        'entries': len(custom),
+        'chars': len(text),
+        # chars_per_s covers the whole s2t conversion including the user
+        # dictionary, not the trie pass alone
+        'nested_dict_trie': {
+            'key_conversion_s': key_conversion,
+            'build_s': nested_build,
+            'memory_bytes': nested_mem,
+            'chars_per_s': len(text) / nested_match,
+        },
+        'compact_trie': {
+            'build_s': compact_build,
+            'memory_bytes': compact_mem,
+            'chars_per_s': len(text) / compact_match,
+        },
+        # Above 1 when the compact trie is better
+        'compact_vs_nested': {
+            'build': nested_build / compact_build,
+            'memory': nested_mem / compact_mem,
+            'throughput': nested_match / compact_match,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=40000)
+    parser.add_argument('--chars', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.entries, args.chars, args.repeat), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for OpenCC and the Sigil plugin. Every scenario runs in a
+fresh interpreter so cold start times and peak RSS are not skewed by the
+shared dictionary registry or earlier scenarios.
+
+Scenarios:
+  construction  cold and warm OpenCC(config) plus load_dictionaries() for every
+                opencc/config/*.json
+  convert       chars/sec of convert() on synthetic and dictionary-derived
+                corpora of several sizes
+  plugin        end-to-end plugin.run() against a fake Sigil container
+  custom_trie   user dictionary trie memory and throughput
+"""
+from __future__ import print_function
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CONFIG_DIR = os.path.join(ROOT, 'opencc', 'config')
+DICT_DIR = os.path.join(ROOT, 'opencc', 'dictionary')
+SEPARATORS = ['，', '。', '、', '「', '」', ' ', '\n', '！', '？']
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss():
+    """
+    :return: peak resident set size of this process in bytes, or None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def configs():
+    return sorted(name[:-5] for name in os.listdir(CONFIG_DIR) if name.endswith('.json'))
+
+
+def dictionary_pairs(name):
+    with io.open(os.path.join(DICT_DIR, name), encoding='utf-8') as f:
+        return [line.rstrip('\n').split('\t') for line in f if '\t' in line]
+
+
+def make_corpus(kind, size, seed=1):
+    """
+    :param kind: 'synthetic' for random characters from the dictionaries mixed
+                 with ASCII, or 'phrases' for dictionary keys and values
+    :param size: the number of characters
+    """
+    rng = random.Random(seed)
+    pairs = dictionary_pairs('STPhrases.txt') + dictionary_pairs('TSPhrases.txt')
+    pieces = []
+    total = 0
+    if kind == 'synthetic':
+        chars = sorted(set(''.join(key for key, _ in pairs)))
+        ascii_words = ['OpenCC', 'epub', '2016', 'chapter', 'v4.5']
+        while total < size:
+            if rng.random() < 0.1:
+                piece = rng.choice(ascii_words)
+            else:
+                piece = ''.join(rng.choice(chars) for _ in range(rng.randint(2, 12)))
+            pieces.append(piece + rng.choice(SEPARATORS))
+            total += len(pieces[-1])
+    else:
+        while total < size:
+            key, value = rng.choice(pairs)
+            pieces.append(rng.choice([key, value.split(' ')[0]]))
+            if rng.random() < 0.3:
+                pieces.append(rng.choice(SEPARATORS))
+            total += len(pieces[-1])
+    return ''.join(pieces)[:size]
+
+
+def bench_construction(args):
+    """
+    OpenCC(config) only reads the config and builds dictionaries lazily, so
+    cold and warm time the constructor plus load_dictionaries(), with an
+    empty dictionary registry and right after. init is the constructor alone.
+    """
+    from opencc import OpenCC, dict_registry
+    results = {}
+    for config in configs():
+        dict_registry.invalidate()
+        start = time.perf_counter()
+        cc = OpenCC(config)
+        init = time.perf_counter() - start
+        cc.load_dictionaries()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        OpenCC(config).load_dictionaries()
+        warm = time.perf_counter() - start
+        results[config] = {'init_s': init, 'cold_s': cold, 'warm_s': warm}
+    return results
+
+
+def bench_convert(args):
+    from opencc import OpenCC
+    results = {}
+    for config in args.configs or ['s2t', 's2twp', 't2s', 'tw2sp']:
+        cc = OpenCC(config)
+        for kind in ('synthetic', 'phrases'):
+            for size in args.sizes:
+                text = make_corpus(kind, size)
+                start = time.perf_counter()
+                cc.convert(text)
+                elapsed = time.perf_counter() - start
+                results['%s/%s/%d' % (config, kind, size)] = {
+                    'seconds': elapsed,
+                    'chars_per_s': size / elapsed if elapsed else None,
+                }
+    return results
+
+
+def make_book(chapters, chapter_size):
+    files = []
+    for index in range(chapters):
+        text = make_corpus('phrases', chapter_size, seed=index)
+        paragraphs = ''.join('<p class="p">%s</p>\n' % line for line in text.split('\n'))
+        files.append(('c%04d' % index,
+                      '<?xml version="1.0" encoding="utf-8"?>\n<html><head><title>%d</title>'
+                      '<style>p { font-family: "宋体"; }</style></head><body>\n%s</body></html>'
+                      % (index, paragraphs)))
+    return files
+
+
+def bench_plugin(args):
+    import plugin
+    from tests.test_plugin import FakeContainer
+
+    class HeadlessManager(object):
+        """Stands in for the Tk dictionary manager, with the saved choices checked"""
+
+        def __init__(self, dict_dir, mode='s2twp', stats=None):
+            self.dict_dir = dict_dir
+            self.mode = mode
+            self.stats = stats
+            self.dict_order = sorted(f for f in os.listdir(dict_dir) if f.endswith('.txt'))
+            prefs = {}
+            if os.path.exists(plugin.CONFIG_FILE):
+                with io.open(plugin.CONFIG_FILE, encoding='utf-8') as f:
+                    prefs = json.load(f)
+            self.dict_enabled = dict((f, _Checked(prefs.get(f, False))) for f in self.dict_order)
+
+        def show(self):
+            return True
+
+        def take_prepared(self):
+            spec = [(f, os.path.join(self.dict_dir, f), None)
+                    for f in self.dict_order if self.dict_enabled[f].get()]
+            return plugin.prepare_conversion(spec, self.mode, self.stats, cache_dir=cache_dir)
+
+    plugin.MultiDictManager = HeadlessManager
+    book = FakeContainer(make_book(args.chapters, args.chapter_size))
+    # An empty conversion cache of its own, so every run converts every file
+    # and the user's convert_cache/ is left alone
+    cache_dir = tempfile.mkdtemp(prefix='opencc-bench-')
+    try:
+        start = time.perf_counter()
+        plugin.run(book, cache_dir=cache_dir)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    chars = sum(len(data) for data in book.files.values())
+    return {
+        'chapters': args.chapters,
+        'chars': chars,
+        'seconds': elapsed,
+        'chars_per_s': chars / elapsed if elapsed else None,
+    }
+
+
+class _Checked(object):
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def bench_custom_trie(args):
+    from benchmarks import custom_trie
+    return custom_trie.run(args.entries, max(args.sizes))
+
+
+SCENARIOS = {
+    'construction': bench_construction,
+    'convert': bench_convert,
+    'plugin': bench_plugin,
+    'custom_trie': bench_custom_trie,
+}
+
+
+def run_scenario(name, args):
+    """
+    Run one scenario in this process
+    """
+    # stdout carries the JSON result, keep the plugin's messages off it
+    with contextlib.redirect_stdout(sys.stderr):
+        result = SCENARIOS[name](args)
+    return {'result': result, 'peak_rss_bytes': peak_rss()}
+
+
+def run_isolated(name, argv):
+    """
+    Run one scenario in a fresh interpreter
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks', '--in-process', name] + argv, cwd=ROOT)
+    return json.loads(output.decode('utf-8'))
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(old, new):
+    """
+    Pair up the numbers of two result files
+    :return: dict of dotted path to (old, new, new / old)
+    """
+    rows = {}
+
+    def walk(a, b, path):
+        if isinstance(a, dict) and isinstance(b, dict):
+            for key in sorted(set(a) & set(b)):
+                walk(a[key], b[key], path + [key])
+        elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and \
+                not isinstance(a, bool):
+            rows['.'.join(path)] = (a, b, b / a if a else None)
+
+    walk(old.get('scenarios', {}), new.get('scenarios', {}), [])
+    return rows
@@ -5,3 +5,4 @@
 ##########################################################
 
 from .opencc import OpenCC
+from .opencc import CompactTrie, ConversionStats, DictRegistry, SegmentCache, dict_registry
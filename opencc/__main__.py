@@ -1,16 +1,95 @@
 from __future__ import print_function
 
 import argparse
+import os
 import sys
 import io
 from opencc import OpenCC
+from opencc import daemon
+from opencc.opencc import DEFAULT_STREAM_CHUNK
+
+
+def batch_files(inputs):
+    """
+    List the files to convert for several inputs
+    :param inputs: list of files and directories
+    :return: generator of (file, path relative to the output directory)
+    """
+    for path in inputs:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    file_path = os.path.join(dirpath, name)
+                    yield file_path, os.path.relpath(file_path, path)
+        else:
+            yield path, os.path.basename(path)
+
+
+def duplicate_outputs(files):
+    """
+    Find the inputs that would be written to the same output file
+    :param files: list of (file, path relative to the output directory)
+    :return: list of (relative path, list of files) for every clash
+    """
+    by_output = {}
+    for file_path, rel_path in files:
+        by_output.setdefault(os.path.normcase(os.path.normpath(rel_path)),
+                             []).append(file_path)
+    return [(rel_path, paths) for rel_path, paths in sorted(by_output.items())
+            if len(paths) > 1]
+
+
+def convert_batch(cc, files, output_dir, args):
+    """
+    Convert several files into output_dir with a process pool
+    :param files: list of (file, path relative to output_dir), see
+                  batch_files
+    """
+    texts = []
+    for file_path, _ in files:
+        with io.open(file_path, encoding=args.in_enc) as f:
+            texts.append(f.read())
+    for (_, rel_path), converted in zip(files, cc.convert_many(texts, args.jobs)):
+        out_path = os.path.join(output_dir, rel_path)
+        out_dir = os.path.dirname(out_path)
+        if out_dir and not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        with io.open(out_path, 'w', encoding=args.out_enc) as f:
+            f.write(converted)
+
+
+def convert_with_daemon(input_file, args):
+    """
+    Convert through a running conversion daemon
+    :return: True if converted, False to convert in this process instead
+    """
+    client = daemon.connect()
+    if client is None:
+        return False
+    # Keep stdin open for converting in this process
+    with client, io.open(input_file, encoding=args.in_enc,
+                         closefd=not isinstance(input_file, int)) as fin:
+        try:
+            # Fails before anything is read if the conversion is not served
+            converted = client.iter_convert(
+                args.config, iter(lambda: fin.read(DEFAULT_STREAM_CHUNK), ''))
+        except (IOError, OSError, ValueError):
+            return False
+        with io.open(args.output if args.output else 1, 'w',
+                     encoding=args.out_enc) as fout:
+            for piece in converted:
+                fout.write(piece)
+    return True
 
 
 def main():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('-i', '--input', metavar='<file>',
-                        help='Read original text from <file>.')
+    parser.add_argument('-i', '--input', metavar='<file>', nargs='+',
+                        help='Read original text from <file>. Several files '
+                             'or a directory are converted into the -o '
+                             'directory.')
     parser.add_argument('-o', '--output', metavar='<file>',
                         help='Write converted text to <file>.')
     parser.add_argument('-c', '--config', metavar='<conversion>',
@@ -19,15 +98,58 @@ def main():
                         help='Encoding for input')
     parser.add_argument('--out-enc', metavar='<encoding>', default='UTF-8',
                         help='Encoding for output')
+    parser.add_argument('--stream', action='store_true',
+                        help='Convert while reading, with bounded memory')
+    parser.add_argument('-j', '--jobs', metavar='<n>', type=int,
+                        help='Number of worker processes for several input '
+                             'files. None uses all CPUs.')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='Convert in this process even if a conversion '
+                             'daemon (python -m opencc.daemon) is running')
+    parser.add_argument('--candidates', action='store_true',
+                        help='Choose among the candidates of entries that '
+                             'have several from their context instead of '
+                             'taking the first. Converts in this process.')
     args = parser.parse_args()
 
     if args.config is None:
         print("Please specify a conversion.", file=sys.stderr)
         return 1
 
-    cc = OpenCC(args.config)
+    cc = OpenCC(args.config, select_candidates=args.candidates)
+
+    inputs = args.input if args.input else []
+    if len(inputs) > 1 or (inputs and os.path.isdir(inputs[0])):
+        if args.output is None:
+            print("Please specify an output directory for several inputs.",
+                  file=sys.stderr)
+            return 1
+        files = list(batch_files(inputs))
+        duplicates = duplicate_outputs(files)
+        if duplicates:
+            # Nothing is converted rather than one output overwriting another
+            for rel_path, paths in duplicates:
+                print("%s would all be written to %s" % (
+                    ", ".join(paths), os.path.join(args.output, rel_path)),
+                    file=sys.stderr)
+            return 1
+        convert_batch(cc, files, args.output, args)
+        return 0
+    input_file = inputs[0] if inputs else 0
+
+    # The daemon always takes the first candidate
+    if not args.no_daemon and not args.candidates and convert_with_daemon(input_file, args):
+        return 0
+
+    if args.stream:
+        with io.open(input_file,
+                     encoding=args.in_enc) as fin, \
+                io.open(args.output if args.output else 1, 'w',
+                        encoding=args.out_enc) as fout:
+            cc.convert_stream(fin, fout)
+        return 0
 
-    with io.open(args.input if args.input else 0, encoding=args.in_enc) as f:
+    with io.open(input_file, encoding=args.in_enc) as f:
         input_str = f.read()
     output_str = cc.convert(input_str)
     with io.open(args.output if args.output else 1, 'w',
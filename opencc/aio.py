@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+##########################################################
+# asyncio wrapper around OpenCC
+#
+# Conversion is CPU bound pure Python, so it runs in an executor. Large
+# inputs are cut at separators into chunks converted one after the other,
+# letting other requests in between; small concurrent requests are
+# coalesced into one executor job.
+##########################################################
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from .opencc import OpenCC
+
+# Inputs longer than this are converted in chunks of about this size
+DEFAULT_CHUNK_SIZE = 16384
+# Seconds a small request waits for others to share its executor job
+DEFAULT_BATCH_WINDOW = 0.002
+# Characters after which a batch of small requests is sent without waiting
+DEFAULT_MAX_BATCH_CHARS = 65536
+
+# OpenCC instances of a process pool worker, by their settings
+_process_converters = {}
+
+
+def _convert_in_process(settings, strings):
+    cc = _process_converters.get(settings)
+    if cc is None:
+        conversion, custom_dicts, select_candidates, fuse_chain, custom_on_output = settings
+        cc = _process_converters[settings] = OpenCC(
+            conversion, custom_dicts=list(custom_dicts),
+            select_candidates=select_candidates, fuse_chain=fuse_chain,
+            custom_on_output=custom_on_output)
+    return [cc.convert(string) for string in strings]
+
+
+def _process_settings(cc):
+    """
+    :return: what a process pool worker needs to build the same converter
+     as cc, hashable so workers build it once
+    :raise ValueError: if cc has custom dictionaries held in memory
+    """
+    if any(not isinstance(custom, str) for custom in cc.custom_dicts):
+        raise ValueError("with a ProcessPoolExecutor, custom dictionaries must be "
+                         "paths of txt or compiled dictionaries")
+    return (cc.conversion, tuple(cc.custom_dicts), cc.select_candidates,
+            cc.fuse_chain, cc.custom_on_output)
+
+
+class AsyncOpenCC(object):
+    """
+    Convert text from coroutines without blocking the event loop.
+
+        cc = AsyncOpenCC('s2t')
+        converted = await cc.convert(text)
+    """
+
+    def __init__(self, conversion=None, converter=None, executor=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch_chars=DEFAULT_MAX_BATCH_CHARS):
+        """
+        :param conversion: the conversion, see OpenCC
+        :param converter: an OpenCC to use instead of creating one
+        :param executor: the concurrent.futures executor to convert in,
+         defaults to the loop's default executor. With a ProcessPoolExecutor,
+         workers create their own OpenCC with the conversion, custom
+         dictionaries and options of converter, so
+         its custom dictionaries must be given as paths.
+        :param chunk_size: inputs longer than this are converted in chunks,
+         yielding to the event loop between chunks
+        :param batch_window: seconds small requests wait to be batched together
+        :param max_batch_chars: batch size that is sent without waiting
+        :raise ValueError: if converter has custom dictionaries held in
+         memory and executor is a ProcessPoolExecutor
+        """
+        self.cc = converter if converter is not None else OpenCC(conversion)
+        if isinstance(executor, ProcessPoolExecutor):
+            _process_settings(self.cc)
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.batch_window = batch_window
+        self.max_batch_chars = max_batch_chars
+        self._pending = []
+        self._pending_chars = 0
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def convert(self, string):
+        """
+        Convert a string
+        :param string: the input string
+        :return: converted string
+        """
+        if len(string) <= self.chunk_size:
+            return await self._convert_small(string)
+        result = []
+        for chunk in self.cc.iter_chunks(string, self.chunk_size):
+            converted = await self._run([chunk])
+            result.append(converted[0])
+        return "".join(result)
+
+    async def convert_many(self, strings):
+        """
+        Convert several strings concurrently
+        :return: list of converted strings, in the order of strings
+        """
+        return await asyncio.gather(*[self.convert(string) for string in strings])
+
+    async def _run(self, strings):
+        loop = asyncio.get_running_loop()
+        if isinstance(self.executor, ProcessPoolExecutor):
+            return await loop.run_in_executor(
+                self.executor, _convert_in_process, _process_settings(self.cc), strings)
+        return await loop.run_in_executor(self.executor, self._convert_batch, strings)
+
+    def _convert_batch(self, strings):
+        return [self.cc.convert(string) for string in strings]
+
+    async def _convert_small(self, string):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((string, future))
+        self._pending_chars += len(string)
+        if self._pending_chars >= self.max_batch_chars:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = self._pending
+        self._pending = []
+        self._pending_chars = 0
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            # Keep a reference until the batch is done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        try:
+            results = await self._run([string for string, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), converted in zip(batch, results):
+            if not future.done():
+                future.set_result(converted)
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# Conversion daemon
+#
+# A long-lived process holding every conversion in the config directory
+# with its dictionaries loaded, serving requests on a Unix domain socket so
+# short command line runs do not pay for loading them.
+#
+# Every message is a frame: a big endian uint32 length then that many
+# bytes. A request is a JSON header frame, e.g. {"config": "s2t"}, followed
+# by UTF-8 text frames and an empty frame. The daemon answers with a JSON
+# status frame, {"ok": true} or {"error": "..."}, then converted UTF-8 text
+# frames as soon as they are ready and an empty frame.
+#
+#   python -m opencc.daemon            start serving
+#   python -m opencc.daemon --stop     stop a running daemon
+##########################################################
+
+import argparse
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+
+try:
+    import socketserver
+except ImportError:  # Python 2
+    import SocketServer as socketserver
+
+from .opencc import CONFIG_DIR, DEFAULT_STREAM_CHUNK, OpenCC
+
+# Overrides the default socket path
+SOCKET_ENV = 'OPENCC_SOCKET'
+FRAME = struct.Struct(str('>I'))
+
+
+def default_socket_path():
+    """
+    :return: the socket path from $OPENCC_SOCKET, else a path in the per
+             user $XDG_RUNTIME_DIR, else a per user path in the temporary
+             directory
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, 'opencc.sock')
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', '')
+    return os.path.join(tempfile.gettempdir(), 'opencc-%s.sock' % user)
+
+
+def write_frame(stream, data):
+    stream.write(FRAME.pack(len(data)) + data)
+    stream.flush()
+
+
+def read_frame(stream):
+    """
+    :return: the frame payload, or None at the end of the stream
+    """
+    header = stream.read(FRAME.size)
+    if len(header) < FRAME.size:
+        return None
+    size = FRAME.unpack(header)[0]
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return data
+
+
+def _read_text_frames(stream):
+    while True:
+        data = read_frame(stream)
+        if not data:
+            return
+        yield data.decode('utf-8')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        header = read_frame(self.rfile)
+        if header is None:
+            return
+        try:
+            request = json.loads(header.decode('utf-8'))
+        except ValueError:
+            self._status({'error': 'malformed request'})
+            return
+        command = request.get('command', 'convert')
+        if command == 'ping':
+            self._status({'ok': True, 'configs': sorted(self.server.converters)})
+        elif command == 'shutdown':
+            self._status({'ok': True})
+            # shutdown() waits for serve_forever, which runs this handler
+            threading.Thread(target=self.server.shutdown).start()
+        elif command == 'convert':
+            cc = self.server.converters.get(request.get('config'))
+            if cc is None:
+                self._status({'error': 'unknown conversion %r' % request.get('config')})
+                return
+            self._status({'ok': True})
+            for converted in cc.iter_convert(_read_text_frames(self.rfile)):
+                if converted:
+                    write_frame(self.wfile, converted.encode('utf-8'))
+            write_frame(self.wfile, b'')
+        else:
+            self._status({'error': 'unknown command %r' % command})
+
+    def _status(self, status):
+        write_frame(self.wfile, json.dumps(status).encode('utf-8'))
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:  # No Unix domain sockets, e.g. Windows
+    _Server = None
+
+
+def load_converters(configs=None):
+    """
+    Create a converter for every conversion with its dictionaries loaded
+    :param configs: the conversions, defaults to every json file in the
+                    config directory
+    :return: dict of conversion to OpenCC
+    """
+    if configs is None:
+        config_dir = os.path.join(os.path.dirname(__file__), CONFIG_DIR)
+        configs = sorted(name[:-5] for name in os.listdir(config_dir)
+                         if name.endswith('.json'))
+    converters = {}
+    for config in configs:
+        cc = OpenCC(config)
+        cc.load_dictionaries()
+        converters[config] = cc
+    return converters
+
+
+def serve(path=None, configs=None):
+    """
+    Serve conversion requests until a shutdown request arrives
+    :param path: the socket path, see default_socket_path
+    :param configs: the conversions to serve, see load_converters
+    :return: None
+    """
+    if _Server is None:
+        raise OSError('Unix domain sockets are not supported on this platform')
+    path = path or default_socket_path()
+    if os.path.exists(path):
+        if not _is_own_socket(path):
+            raise OSError('%s exists and is not a socket of the current user' % path)
+        client = connect(path)
+        if client is not None:
+            client.close()
+            raise OSError('a daemon is already listening on %s' % path)
+        # Left behind by a daemon that did not exit cleanly
+        os.remove(path)
+    converters = load_converters(configs)
+    # Only the current user may connect
+    umask = os.umask(0o077)
+    try:
+        server = _Server(path, _Handler)
+    finally:
+        os.umask(umask)
+    server.converters = converters
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def connect(path=None):
+    """
+    Connect to a running daemon
+    :param path: the socket path, see default_socket_path
+    :return: DaemonClient, or None if no daemon is listening
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = path or default_socket_path()
+    if not _is_own_socket(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (IOError, OSError):
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+
+def _is_own_socket(path):
+    """
+    Only connect to a socket the current user owns: in a shared temporary
+    directory another user could create the socket first and receive
+    every conversion
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and (not hasattr(os, 'getuid') or st.st_uid == os.getuid())
+
+
+class DaemonClient(object):
+    """
+    One request to the daemon. Create it with connect().
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._rfile = sock.makefile('rb')
+        self._wfile = sock.makefile('wb')
+        self._send_error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._rfile.close()
+        self._wfile.close()
+        self.sock.close()
+
+    def _request(self, request):
+        write_frame(self._wfile, json.dumps(request).encode('utf-8'))
+        status = read_frame(self._rfile)
+        if status is None:
+            raise IOError('the daemon closed the connection')
+        status = json.loads(status.decode('utf-8'))
+        if 'error' in status:
+            raise ValueError(status['error'])
+        return status
+
+    def ping(self):
+        """
+        :return: the list of conversions the daemon serves
+        """
+        return self._request({'command': 'ping'})['configs']
+
+    def shutdown(self):
+        """
+        Ask the daemon to exit
+        :return: None
+        """
+        self._request({'command': 'shutdown'})
+
+    def iter_convert(self, conversion, chunks):
+        """
+        Convert text arriving in chunks, see OpenCC.iter_convert. ValueError
+        is raised before any chunk is read if the daemon does not serve the
+        conversion.
+        :param conversion: the conversion, e.g. 's2t'
+        :param chunks: iterable of strings
+        :return: generator of converted strings
+        """
+        self._request({'command': 'convert', 'config': conversion})
+
+        def send():
+            try:
+                for chunk in chunks:
+                    if chunk:
+                        write_frame(self._wfile, chunk.encode('utf-8'))
+                write_frame(self._wfile, b'')
+            except Exception as e:
+                # Reading the input failed: end the request without its
+                # final frame and raise the error once the daemon is done
+                self._send_error = e
+                try:
+                    self.sock.shutdown(socket.SHUT_WR)
+                except (IOError, OSError):
+                    pass
+
+        # Send from another thread so a large input cannot fill both socket
+        # buffers while the daemon waits for its converted text to be read
+        sender = threading.Thread(target=send)
+        sender.daemon = True
+        sender.start()
+        return self._receive(sender)
+
+    def _receive(self, sender):
+        while True:
+            data = read_frame(self._rfile)
+            if data is None:
+                raise IOError('the daemon closed the connection')
+            if not data:
+                break
+            yield data.decode('utf-8')
+        sender.join()
+        if self._send_error is not None:
+            raise self._send_error
+
+    def convert(self, conversion, string):
+        """
+        Convert a string
+        :return: converted string
+        """
+        return ''.join(self.iter_convert(conversion, [string]))
+
+    def convert_stream(self, conversion, readable, writable,
+                       chunk_size=DEFAULT_STREAM_CHUNK):
+        """
+        Convert a text stream into another one, see OpenCC.convert_stream
+        """
+        # Fails before anything is read if the conversion is not served
+        converted = self.iter_convert(
+            conversion, iter(lambda: readable.read(chunk_size), ''))
+        for piece in converted:
+            writable.write(piece)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m opencc.daemon',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-s', '--socket', metavar='<path>',
+                        default=default_socket_path(),
+                        help='Unix domain socket to listen on')
+    parser.add_argument('-c', '--config', metavar='<conversion>', nargs='+',
+                        help='Conversions to serve. None serves every '
+                             'conversion in the config directory.')
+    parser.add_argument('--stop', action='store_true',
+                        help='Stop the daemon listening on the socket')
+    args = parser.parse_args(argv)
+
+    if args.stop:
+        client = connect(args.socket)
+        if client is None:
+            print('No daemon is listening on %s' % args.socket, file=sys.stderr)
+            return 1
+        with client:
+            client.shutdown()
+        return 0
+
+    try:
+        serve(args.socket, args.config)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# Compiled binary dictionary format
+#
+# A compiled dictionary (.ocb) is generated from a txt dictionary and holds
+# the same entries sorted by their UTF-8 encoded key, so it can be opened
+# through mmap and searched without parsing the whole file:
+#
+#   header        MAGIC, version, source mtime and size, entry count,
+#                 max key length, min key length, keys and values blob sizes,
+#                 first character count
+#   key offsets   (count + 1) little endian uint32 byte offsets into keys
+#   value offsets (count + 1) little endian uint32 byte offsets into values
+#   first chars   (first character count + 1) pairs of little endian uint32,
+#                 the code point keys start with and the index of the first
+#                 of those keys, so opening a dictionary does not have to
+#                 search for the characters its keys start with
+#   keys          UTF-8 keys joined by '\n'
+#   values        UTF-8 values joined by '\n', in key order
+#
+# The source mtime and size are recorded so a compiled dictionary is rebuilt
+# automatically when its txt dictionary changes.
+##########################################################
+
+import heapq
+from bisect import bisect_left
+import io
+import os
+import mmap
+import re
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+try:
+    unichr
+except NameError:  # Python 3
+    unichr = chr
+
+EXTENSION = '.ocb'
+MAGIC = b'OCCB'
+VERSION = 2
+HEADER = struct.Struct(str('<4sIdQIIIIII'))
+OFFSET = struct.Struct(str('<I'))
+# Number of entries write_dictionary_stream sorts in memory at a time
+STREAM_RUN_ENTRIES = 100000
+
+
+def source_file(path):
+    """
+    Find the txt dictionary a compiled dictionary is generated from
+    :param path: the compiled dictionary file
+    :return: the txt dictionary file, or None if there is none
+    """
+    if not path.endswith(EXTENSION):
+        return None
+    source = path[:-len(EXTENSION)] + '.txt'
+    if os.path.exists(source):
+        return source
+    return None
+
+
+def compile_dictionary(source, target, entries=None):
+    """
+    Write a compiled dictionary
+    :param source: the txt dictionary file
+    :param target: the compiled dictionary file to write
+    :param entries: the parsed txt dictionary as a tuple of the max key length,
+                    min key length and dict, parsed from source if None
+    :return: None
+    """
+    from .opencc import load_alternates, load_dictionary
+    if entries is None:
+        entries = load_dictionary(source)
+    map_dict = entries[2]
+    # Parsed dictionaries only keep the first candidate, the compiled one
+    # keeps them all like the txt file
+    alternates = load_alternates(source)
+    if alternates:
+        map_dict = dict((key, ' '.join(alternates[key]) if key in alternates else value)
+                        for key, value in map_dict.items())
+    stat = os.stat(source)
+    write_dictionary(target, map_dict, stat.st_mtime, stat.st_size)
+
+
+def write_dictionary(target, map_dict, mtime=0.0, size=0):
+    """
+    Write a dict as a compiled dictionary, e.g. a large user dictionary that
+    should be searched in place instead of held in memory
+    :param target: the compiled dictionary file to write
+    :param map_dict: dict of key to value
+    :param mtime: the mtime of the txt dictionary it is generated from
+    :param size: the size of the txt dictionary it is generated from
+    :return: None
+    """
+    _write_sorted(target, sorted(map_dict.items()), mtime, size)
+
+
+def write_dictionary_stream(target, items, run_entries=STREAM_RUN_ENTRIES):
+    """
+    Write a compiled dictionary from entries too many to hold as a dict, such
+    as those read from a very large file. A key given several times keeps
+    its last value. The entries are sorted in runs of run_entries written to
+    temporary files and merged, so memory stays bounded by run_entries plus
+    two offsets per entry.
+    :param target: the compiled dictionary file to write
+    :param items: iterable of (key, value), neither containing a newline
+    :param run_entries: the number of entries sorted in memory at a time
+    :return: None
+    """
+    temp_dir = tempfile.mkdtemp(prefix='ocb-', dir=os.path.dirname(os.path.abspath(target)))
+    try:
+        runs = []
+        run = {}
+        for key, value in items:
+            # A later value replaces the earlier one within a run
+            run.pop(key, None)
+            run[key] = value
+            if len(run) >= run_entries:
+                runs.append(_write_run(temp_dir, len(runs), run))
+                run = {}
+        if run or not runs:
+            runs.append(_write_run(temp_dir, len(runs), run))
+        files = [io.open(path, 'r', encoding='utf-8') for path in runs]
+        try:
+            # Equal keys come out in run order, the last one wins
+            merged = heapq.merge(*[_read_run(index, f) for index, f in enumerate(files)])
+            _write_sorted(target, _last_values(merged))
+        finally:
+            for f in files:
+                f.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _write_run(temp_dir, index, run):
+    """
+    Write the entries of a run sorted by key, one 'key\tvalue' line each
+    :return: the run file
+    """
+    path = os.path.join(temp_dir, '%d.txt' % index)
+    with io.open(path, 'w', encoding='utf-8') as f:
+        for key in sorted(run):
+            f.write('%s\t%s\n' % (key, run[key]))
+    return path
+
+
+def _read_run(index, f):
+    """
+    :return: generator of (key, run index, line) of a run file
+    """
+    for line in f:
+        yield line[:line.index('\t')], index, line
+
+
+def _last_values(merged):
+    """
+    :param merged: (key, run index, line) sorted by key and run index
+    :return: generator of (key, value), keeping the last line of each key
+    """
+    previous = None
+    for key, _, line in merged:
+        if previous is not None and previous[0] != key:
+            yield previous
+        previous = (key, line[len(key) + 1:-1])
+    if previous is not None:
+        yield previous
+
+
+def _write_sorted(target, items, mtime=0.0, size=0):
+    """
+    Write a compiled dictionary from entries sorted by key, holding only
+    their offsets in memory
+    :param items: iterable of (key, value) sorted by key, keys unique
+    """
+    key_offsets = array(str('I'), [0])
+    value_offsets = array(str('I'), [0])
+    firsts = array(str('I'))
+    max_len = 0
+    min_len = 0
+    # Write to temporary files first so readers never see a partial file
+    temp = '%s.%d.tmp' % (target, os.getpid())
+    parts = [temp + '.keys', temp + '.values']
+    try:
+        with open(parts[0], 'wb') as keys_file, open(parts[1], 'wb') as values_file:
+            for key, value in items:
+                key_bytes = key.encode('utf-8')
+                value_bytes = value.encode('utf-8')
+                if len(key_offsets) > 1:
+                    keys_file.write(b'\n')
+                    values_file.write(b'\n')
+                keys_file.write(key_bytes)
+                values_file.write(value_bytes)
+                # Keys sharing a first character are contiguous in UTF-8 order
+                if key and (not firsts or firsts[-2] != ord(key[0])):
+                    firsts.append(ord(key[0]))
+                    firsts.append(len(key_offsets) - 1)
+                key_offsets.append(key_offsets[-1] + len(key_bytes) + 1)
+                value_offsets.append(value_offsets[-1] + len(value_bytes) + 1)
+                if len(key) > max_len:
+                    max_len = len(key)
+                if not min_len or len(key) < min_len:
+                    min_len = len(key)
+        count = len(key_offsets) - 1
+        firsts.append(0)
+        firsts.append(count)
+        if sys.byteorder != 'little':
+            for table in (key_offsets, value_offsets, firsts):
+                table.byteswap()
+        with open(temp, 'wb') as out:
+            # Same defaults as load_dictionary for an empty dictionary
+            out.write(HEADER.pack(MAGIC, VERSION, mtime, size, count,
+                                  max_len or 1, min_len or 1000,
+                                  os.path.getsize(parts[0]), os.path.getsize(parts[1]),
+                                  len(firsts) // 2 - 1))
+            for table in (key_offsets, value_offsets, firsts):
+                out.write(table.tobytes() if hasattr(table, 'tobytes') else table.tostring())
+            for part in parts:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        getattr(os, 'replace', os.rename)(temp, target)
+    finally:
+        for path in parts + [temp]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def is_up_to_date(path, source):
+    """
+    Check a compiled dictionary against its txt dictionary
+    :param path: the compiled dictionary file
+    :param source: the txt dictionary file, or None
+    :return: True if path exists and was compiled from the current source
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+    except (IOError, OSError):
+        return False
+    if len(header) < HEADER.size:
+        return False
+    magic, version, mtime, size = HEADER.unpack(header)[:4]
+    if magic != MAGIC or version != VERSION:
+        return False
+    if source is None:
+        return True
+    stat = os.stat(source)
+    return mtime == stat.st_mtime and size == stat.st_size
+
+
+def load(path):
+    """
+    Open a compiled dictionary, compiling it from its txt dictionary first
+    if it is missing or out of date. If the compiled file cannot be written
+    the txt dictionary is parsed instead.
+    :param path: the compiled dictionary file
+    :return: a tuple of the max key length, min key length and a mapping
+    """
+    source = source_file(path)
+    if not is_up_to_date(path, source):
+        if source is None:
+            raise ValueError('%s is not a compiled dictionary' % path)
+        from .opencc import load_dictionary
+        entries = load_dictionary(source)
+        try:
+            compile_dictionary(source, path, entries)
+        except (IOError, OSError):
+            return entries
+    table = BinaryDict(path)
+    return table.max_len, table.min_len, table
+
+
+class BinaryDict(object):
+    """
+    Read-only mapping over a compiled dictionary. Lookups binary search the
+    mmap'd sorted keys, so only the probed keys are ever decoded. It can
+    also serve as a user dictionary matched in place, see prefixes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (_, _, _, _, self._count, self.max_len, self.min_len,
+         keys_size, values_size, self._first_count) = HEADER.unpack_from(self._mm, 0)
+        self._key_offsets = HEADER.size
+        self._value_offsets = self._key_offsets + (self._count + 1) * OFFSET.size
+        self._first_offsets = self._value_offsets + (self._count + 1) * OFFSET.size
+        self._keys = self._first_offsets + (self._first_count + 1) * 2 * OFFSET.size
+        self._values = self._keys + keys_size
+        self._end = self._values + values_size
+        self._key_table = self._offset_table(self._key_offsets, self._count + 1)
+        self._value_table = self._offset_table(self._value_offsets, self._count + 1)
+        # First character -> index range of the keys starting with it
+        self._first_ranges = None
+        self._first_chars = None
+
+    def _offset_table(self, table, length):
+        """
+        :return: a sequence of the length offsets stored at table, read in place
+        """
+        if sys.byteorder == 'little' and hasattr(memoryview, 'cast'):
+            return memoryview(self._mm)[table:table + length * OFFSET.size].cast('I')
+        # Python 2 or a big endian machine
+        return _OffsetTable(self._mm, table)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __getitem__(self, key):
+        index = self._find(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._value(index)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        index = self._find(key)
+        if index < 0:
+            return default
+        return self._value(index)
+
+    def keys(self):
+        if not self._count:
+            return []
+        return self._mm[self._keys:self._values].decode('utf-8').split('\n')
+
+    def values(self):
+        if not self._count:
+            return []
+        return self._mm[self._values:self._end].decode('utf-8').split('\n')
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def close(self):
+        for table in (self._key_table, self._value_table):
+            if isinstance(table, memoryview):
+                table.release()
+        self._mm.close()
+
+    def _key(self, index):
+        start = self._keys + self._key_table[index]
+        end = self._keys + self._key_table[index + 1] - 1
+        return self._mm[start:end]
+
+    def _value(self, index):
+        start = self._values + self._value_table[index]
+        end = self._values + self._value_table[index + 1] - 1
+        return self._mm[start:end].decode('utf-8')
+
+    def _lower(self, target, lo, hi):
+        """
+        :return: the first index in [lo, hi) whose key is not less than target
+        """
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key):
+        target = key.encode('utf-8')
+        index = self._lower(target, 0, self._count)
+        if index < self._count and self._key(index) == target:
+            return index
+        return -1
+
+    def search_keys(self, chars):
+        """
+        Find the entries whose keys hold any of some characters, scanning
+        the keys in place instead of decoding them all
+        :param chars: iterable of characters, '\n' is left out
+        :return: dict of key to first candidate
+        """
+        chars = sorted(char.encode('utf-8') for char in chars if char != '\n')
+        if not chars or not self._count:
+            return {}
+        # UTF-8 never has the encoding of one character inside another's
+        pattern = re.compile(b'|'.join(re.escape(char) for char in chars))
+        mm = self._mm
+        keys = self._keys
+        end = self._values
+        found = {}
+        pos = keys
+        while True:
+            match = pattern.search(mm, pos, end)
+            if match is None:
+                break
+            start = mm.rfind(b'\n', keys, match.start()) + 1 or keys
+            stop = mm.find(b'\n', match.end(), end)
+            if stop < 0:
+                stop = end
+            index = bisect_left(self._key_table, start - keys, 0, self._count)
+            found[mm[start:stop].decode('utf-8')] = self._value(index).split(' ')[0]
+            pos = stop
+        return found
+
+    def first_chars(self):
+        """
+        :return: frozenset of the characters keys start with
+        """
+        if self._first_ranges is None:
+            # Read from the first character table written with the keys
+            length = (self._first_count + 1) * 2
+            table = self._offset_table(self._first_offsets, length)
+            if isinstance(table, memoryview):
+                pairs = table.tolist()
+                table.release()
+            else:
+                pairs = [table[i] for i in range(length)]
+            codes = pairs[0::2]
+            starts = pairs[1::2]
+            self._first_ranges = dict((unichr(codes[i]), (starts[i], starts[i + 1]))
+                                      for i in range(self._first_count))
+            self._first_chars = frozenset(self._first_ranges)
+        return self._first_chars
+
+    def prefixes(self, string, start):
+        """
+        Find the keys that string has at offset start, like
+        CompactTrie.prefixes. The keys starting with a prefix are contiguous
+        in the sorted order, so every longer prefix is only searched for in
+        the range of the one before it.
+        :return: list of (key length, first candidate), shortest first
+        """
+        if self._first_ranges is None:
+            self.first_chars()
+        result = []
+        if start >= len(string):
+            return result
+        char = string[start]
+        span = self._first_ranges.get(char)
+        if span is None:
+            return result
+        lo, hi = span
+        # The binary searches are inlined, this runs at every offset
+        mm = self._mm
+        keys = self._keys
+        table = self._key_table
+        target = char.encode('utf-8')
+        stop = start + 1
+        end = min(len(string), start + self.max_len)
+        key = mm[keys + table[lo]:keys + table[lo + 1] - 1]
+        while True:
+            if key == target:
+                result.append((stop - start, self._value(lo).split(' ')[0]))
+                lo += 1
+            if stop == end or lo == hi:
+                break
+            stop += 1
+            target = string[start:stop].encode('utf-8')
+            # First key not less than target; if it does not start with
+            # target, no key does
+            high = hi
+            while lo < high:
+                mid = (lo + high) // 2
+                if mm[keys + table[mid]:keys + table[mid + 1] - 1] < target:
+                    lo = mid + 1
+                else:
+                    high = mid
+            if lo == hi:
+                break
+            key = mm[keys + table[lo]:keys + table[lo + 1] - 1]
+            if not key.startswith(target):
+                break
+        return result
+
+
+class _OffsetTable(object):
+    """
+    The offsets stored at a position of a compiled dictionary, read with
+    struct where memoryview.cast is not available
+    """
+
+    def __init__(self, mm, table):
+        self._mm = mm
+        self._table = table
+
+    def __getitem__(self, index):
+        return OFFSET.unpack_from(self._mm, self._table + index * OFFSET.size)[0]
+
+
+def main(argv=None):
+    """
+    Compile txt dictionaries given on the command line next to their source
+    """
+    for source in (argv if argv is not None else sys.argv[1:]):
+        target = os.path.splitext(source)[0] + EXTENSION
+        compile_dictionary(source, target)
+        print('%s -> %s' % (source, target))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
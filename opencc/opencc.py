@@ -18,7 +18,7 @@ from __future__ import (unicode_literals, division, absolute_import,
 # - Only match once per dictionary
 # - If a dictionary is configured as part of a group, only match once per group
 #   in order of the listed dictionaries
-# - Cache the results of reading a dictionary in self.dict_cache
+# - Cache the results of reading a dictionary
 # - Use "from __future__ import" to allow support for both Python 2.7
 #   and Python >3.2
 ##########################################################
@@ -26,19 +26,587 @@ from __future__ import (unicode_literals, division, absolute_import,
 import io
 import os
 import json
+import math
+import multiprocessing
 import re
+import sys
+import threading
+import time
+import itertools
+import warnings
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from . import ocd
+
+try:
+    unichr
+except NameError:  # Python 3
+    unichr = chr
 
 CONFIG_DIR = 'config'
 DICT_DIR = 'dictionary'
+# Upper bound on the number of table entries (dictionary entries plus compiled
+# group prefixes) the shared registry keeps before evicting
+DEFAULT_REGISTRY_MAX_ENTRIES = 2000000
+# Number of characters read at a time by convert_stream
+DEFAULT_STREAM_CHUNK = 65536
+# Number of characters iter_convert buffers while waiting for a separator
+DEFAULT_STREAM_BUFFER = 1 << 20
+
+
+def load_dictionary(path):
+    """
+    Parse a txt dictionary file, keeping the first candidate of each
+    entry. The others are loaded on demand, see load_alternates.
+    :param path: the dictionary file
+    :return: a tuple of the max key length, min key length and dict
+    """
+    map_dict = {}
+    # Default max key length to smallest possible value
+    max_len = 1
+    # Default min key length to very large value
+    min_len = 1000
+    with io.open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            key, value = line.strip().split('\t')
+            # multiple mapping, use the first one for now
+            map_dict[key] = value.split(' ')[0]
+            if len(key) > max_len:
+                max_len = len(key)
+            if len(key) < min_len:
+                min_len = len(key)
+    return max_len, min_len, map_dict
+
+
+def load_custom_dictionary(path):
+    """
+    Parse a user dictionary txt file, keeping the first candidate of each
+    entry. Unlike the bundled dictionaries, user dictionaries are written by
+    hand, so blank lines are skipped and lines without a tab separated value
+    are skipped with a warning giving their line numbers.
+    :param path: the dictionary file
+    :return: dict of key to value
+    """
+    map_dict = {}
+    malformed = []
+    with io.open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            parts = line.strip().split('\t')
+            if not parts[0]:
+                continue
+            values = parts[1].split() if len(parts) >= 2 else None
+            if values:
+                map_dict[parts[0]] = values[0]
+            else:
+                malformed.append(line_no)
+    if malformed:
+        warnings.warn('%s: skipped %d lines without a tab separated value, line %s'
+                      % (path, len(malformed), ', '.join(map(str, malformed[:20]))))
+    return map_dict
+
+
+def load_alternates(path):
+    """
+    Parse the entries of a dictionary that have several candidates
+    :param path: the dictionary file
+    :return: dict of key to the tuple of all its candidates
+    """
+    if path.endswith(ocd.EXTENSION):
+        items = ocd.load(path)[2].items()
+    else:
+        with io.open(path, "r", encoding="utf-8") as f:
+            items = [line.strip().split('\t') for line in f]
+    return dict((key, tuple(value.split(' '))) for key, value in items if ' ' in value)
+
+
+# The key at the start of every line of a txt dictionary
+_KEY_RE = re.compile(r'^[^\t\n]+', re.M)
+
+
+def load_key_summary(path):
+    """
+    Collect the characters the keys of a dictionary start with and its
+    max key length, without parsing its entries
+    :param path: the dictionary file
+    :return: a tuple of a frozenset of characters and the max key length
+    """
+    if path.endswith(ocd.EXTENSION):
+        max_len, _, table = ocd.load(path)
+        if isinstance(table, ocd.BinaryDict):
+            return table.first_chars(), max_len
+        return frozenset(key[0] for key in table if key), max_len
+    with io.open(path, "r", encoding="utf-8") as f:
+        keys = [key.strip() for key in _KEY_RE.findall(f.read())]
+    return (frozenset(key[:1] for key in keys) - frozenset(['']),
+            max([len(key) for key in keys] + [1]))
+
+
+# Pattern -> the characters it splits at, see separator_chars
+_separator_chars = {}
+
+
+def separator_chars(split_chars_re):
+    """
+    Collect the characters a separator expression matches, such as the
+    split_chars_re of OpenCC
+    :param split_chars_re: compiled expression matching single characters
+    :return: frozenset of characters
+    """
+    chars = _separator_chars.get(split_chars_re.pattern)
+    if chars is None:
+        match = split_chars_re.match
+        chars = frozenset(char for char in map(unichr, range(0x10000)) if match(char))
+        _separator_chars[split_chars_re.pattern] = chars
+    return chars
+
+
+class DictRegistry(object):
+    """
+    Process-wide cache of parsed dictionaries and compiled dictionary groups,
+    shared by every OpenCC instance. Entries are keyed by file path and mtime,
+    so an edited dictionary is reloaded on next use. The least recently used
+    entries are evicted once the total number of table entries exceeds
+    max_entries.
+    """
+
+    def __init__(self, max_entries=DEFAULT_REGISTRY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.size = 0
+        self._lock = threading.RLock()
+        # key -> (size, data), in least recently used first order
+        self._entries = OrderedDict()
+
+    def get_dict(self, path):
+        """
+        Get a parsed dictionary, loading it if needed
+        :param path: the dictionary file
+        :return: a tuple of the max key length, min key length and dict
+        """
+        key = ('dict', self._file_key(path))
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                self._discard_stale(*key[1])
+                if path.endswith(ocd.EXTENSION):
+                    entry = ocd.load(path)
+                else:
+                    entry = load_dictionary(path)
+                self._put(key, len(entry[2]), entry)
+            return entry
+
+    def get_custom_dict(self, path):
+        """
+        Get a parsed user dictionary, loading it if needed
+        :param path: the txt dictionary file, see load_custom_dictionary
+        :return: dict of key to value
+        """
+        key = ('custom', self._file_key(path))
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                self._discard_stale(*key[1])
+                entry = load_custom_dictionary(path)
+                self._put(key, len(entry), entry)
+            return entry
+
+    def get_alternates(self, path):
+        """
+        Get the candidates of the entries of a dictionary that have several.
+        Conversion only uses the first candidate, so these are only loaded
+        when asked for.
+        :param path: the dictionary file
+        :return: dict of key to the tuple of all its candidates
+        """
+        key = ('alternates', self._file_key(path))
+        with self._lock:
+            alternates = self._get(key)
+            if alternates is None:
+                self._discard_stale(*key[1])
+                alternates = load_alternates(path)
+                self._put(key, len(alternates), alternates)
+            return alternates
+
+    def get_first_chars(self, path):
+        """
+        Get the characters the keys of a dictionary start with
+        :param path: the dictionary file
+        :return: frozenset of characters
+        """
+        return self._get_key_summary(path)[0]
+
+    def get_max_len(self, path):
+        """
+        Get the max key length of a dictionary without parsing it
+        :param path: the dictionary file
+        :return: int
+        """
+        return self._get_key_summary(path)[1]
+
+    def _get_key_summary(self, path):
+        key = ('chars', self._file_key(path))
+        with self._lock:
+            summary = self._get(key)
+            if summary is None:
+                self._discard_stale(*key[1])
+                summary = load_key_summary(path)
+                self._put(key, len(summary[0]), summary)
+            return summary
+
+    def get_group(self, paths, tails=()):
+        """
+        Get a compiled DictGroup for a list of dictionary files
+        :param paths: the dictionary files, in group priority order
+        :param tails: lists of single character dictionary files of the
+                      stages fused into this one, see DictGroup
+        :return: DictGroup
+        """
+        key = ('group', tuple(self._file_key(path) for path in paths),
+               tuple(tuple(self._file_key(path) for path in tail) for tail in tails))
+        with self._lock:
+            group = self._get(key)
+            if group is None:
+                group = DictGroup([self.get_dict(path) for path in paths],
+                                  tails=[[self.get_dict(path) for path in tail]
+                                         for tail in tails])
+                self._put(key, len(group.table), group)
+            return group
+
+    def get_selector(self, paths, segmentation, tails=()):
+        """
+        Get the CandidateSelector of a stage
+        :param paths: the dictionary files of the stage, in group priority order
+        :param segmentation: the segmentation dictionary file of the config,
+                             whose values the context table is counted from
+        :param tails: lists of dictionary files of the fused stages, see
+                      get_group
+        :return: CandidateSelector
+        """
+        key = ('selector', tuple(self._file_key(path) for path in list(paths) + [segmentation]),
+               tuple(tuple(self._file_key(path) for path in tail) for tail in tails))
+        with self._lock:
+            selector = self._get(key)
+            if selector is None:
+                # A key takes its candidates from the first dictionary of the
+                # group that has it, like its first candidate in the table
+                alternates = {}
+                for index, path in enumerate(paths):
+                    earlier = [self.get_dict(other)[2] for other in paths[:index]]
+                    for entry, candidates in self.get_alternates(path).items():
+                        if entry not in alternates and not any(entry in table for table in earlier):
+                            alternates[entry] = candidates
+                selector = CandidateSelector(alternates, self.get_dict(segmentation)[2],
+                                             self.get_group(paths, tails).tail_map)
+                self._put(key, len(selector.alternates) + len(selector.context), selector)
+            return selector
+
+    def invalidate(self, path=None):
+        """
+        Drop cached data so it is reloaded on next use
+        :param path: drop only the dictionary file and the groups using it,
+                     or everything if None
+        :return: None
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.size = 0
+            else:
+                self._discard_stale(os.path.abspath(path))
+
+    def set_max_entries(self, max_entries):
+        """
+        Change the size bound, evicting entries if needed
+        :param max_entries: the maximum number of table entries to keep
+        :return: None
+        """
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    @staticmethod
+    def _file_key(path):
+        path = os.path.abspath(path)
+        # A compiled dictionary is out of date as soon as its source changes
+        return path, os.path.getmtime(ocd.source_file(path) or path)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        # Mark as most recently used
+        del self._entries[key]
+        self._entries[key] = entry
+        return entry[1]
+
+    def _put(self, key, size, data):
+        self._entries[key] = (size, data)
+        self.size += size
+        self._evict()
+
+    def _evict(self):
+        # Always keep the most recently added entry, even when it alone is
+        # larger than the bound
+        while self.size > self.max_entries and len(self._entries) > 1:
+            _, (size, _) = self._entries.popitem(last=False)
+            self.size -= size
+
+    def _discard_stale(self, path, mtime=None):
+        """
+        Drop the entries using path, except those loaded at mtime
+        """
+        for key in list(self._entries):
+            if key[0] in ('group', 'selector'):
+                file_keys = key[1] + sum(key[2], ())
+            else:
+                file_keys = [key[1]]
+            if any(file_path == path and file_mtime != mtime
+                   for file_path, file_mtime in file_keys):
+                size, _ = self._entries.pop(key)
+                self.size -= size
+
+
+# Shared by all OpenCC instances unless one is given its own registry
+dict_registry = DictRegistry()
+
+
+class SegmentCache(object):
+    """
+    Bounded LRU cache of converted segments, keyed by the conversion and the
+    segment. Bound it by number of entries, by approximate bytes, or both.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=None, max_segment_len=64):
+        """
+        :param max_entries: the maximum number of cached segments, or None
+        :param max_bytes: the maximum size of cached strings in bytes, or None
+        :param max_segment_len: longer segments are converted but not cached
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_segment_len = max_segment_len
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (value, size), in least recently used first order
+        self._entries = OrderedDict()
+
+    def get(self, conversion, segment):
+        """
+        :return: the cached converted segment, or None
+        """
+        key = (conversion, segment)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # Mark as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, conversion, segment, value):
+        if len(segment) > self.max_segment_len:
+            return
+        key = (conversion, segment)
+        size = sys.getsizeof(segment) + sys.getsizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self._entries and (
+                    (self.max_entries is not None and
+                     len(self._entries) > self.max_entries) or
+                    (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        :return: dict of hit, miss and eviction counts and current size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+            }
+
+
+class ConversionStats(object):
+    """
+    Opt-in instrumentation of OpenCC. When an OpenCC is given a
+    ConversionStats it converts through an instrumented path that records
+    wall time per step and per stage, per stage match and table probe
+    counts, a histogram of segment lengths and dictionary load times.
+    Without one, conversion only pays for a single attribute check.
+    One ConversionStats can be shared by several converters.
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: optional function called as callback(kind, name,
+         value) for every recorded event, kind being 'time', 'load' or
+         'stage' and value the elapsed seconds
+        """
+        self.callback = callback
+        self.timer = getattr(time, 'perf_counter', time.time)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        :return: None
+        """
+        with self._lock:
+            # name -> [calls, seconds]
+            self.timings = {}
+            # dictionary file or stage name -> seconds
+            self.loads = {}
+            # stage name -> dict of counters, see add_stage
+            self.stages = {}
+            # power of two upper bound of the length -> number of segments
+            self.segment_lengths = {}
+
+    def add_time(self, name, seconds, calls=1):
+        """
+        Record time spent in a step such as 'split' or 'init'
+        """
+        with self._lock:
+            timing = self.timings.setdefault(name, [0, 0.0])
+            timing[0] += calls
+            timing[1] += seconds
+        if self.callback is not None:
+            self.callback('time', name, seconds)
+
+    def add_load(self, name, seconds):
+        """
+        Record the time taken to load a dictionary file or compile a stage
+        """
+        with self._lock:
+            self.loads[name] = self.loads.get(name, 0.0) + seconds
+        if self.callback is not None:
+            self.callback('load', name, seconds)
+
+    def add_stage(self, name, chars, seconds=0.0, matches=0, probes=0, skipped=False):
+        """
+        Record a segment going through a stage of the conversion chain
+        :param name: the stage name
+        :param chars: the length of the segment
+        :param seconds: the time spent matching and replacing
+        :param matches: the number of keys replaced
+        :param probes: the number of table lookups made
+        :param skipped: True if no key of the stage could match the segment
+        """
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'segments': 0, 'skipped': 0, 'chars': 0,
+                                             'matches': 0, 'probes': 0, 'seconds': 0.0}
+            stage['segments'] += 1
+            stage['skipped'] += skipped
+            stage['chars'] += chars
+            stage['matches'] += matches
+            stage['probes'] += probes
+            stage['seconds'] += seconds
+        if self.callback is not None:
+            self.callback('stage', name, seconds)
+
+    def add_segment(self, length):
+        """
+        Record the length of a segment in the histogram
+        """
+        bucket = 1 << max(length - 1, 0).bit_length() if length else 0
+        with self._lock:
+            self.segment_lengths[bucket] = self.segment_lengths.get(bucket, 0) + 1
+
+    def as_dict(self):
+        """
+        :return: everything recorded, as a dict of JSON types
+        """
+        with self._lock:
+            return {
+                'timings': dict((name, {'calls': calls, 'seconds': seconds})
+                                for name, (calls, seconds) in self.timings.items()),
+                'loads': dict(self.loads),
+                'stages': dict((name, dict(stage)) for name, stage in self.stages.items()),
+                'segment_lengths': dict((str(bucket), count) for bucket, count
+                                        in sorted(self.segment_lengths.items())),
+            }
+
+    def to_json(self, **kwargs):
+        """
+        :param kwargs: passed on to json.dumps
+        :return: as_dict() as a JSON string
+        """
+        return json.dumps(self.as_dict(), **kwargs)
+
+
+# Distinguishes chains built with custom dictionaries in a shared SegmentCache
+_custom_chain_ids = itertools.count(1)
+
+# Converter used by convert_many worker processes. With the fork start method
+# it is set in the parent before the pool starts, so workers inherit the
+# loaded dictionaries instead of receiving them with every task.
+_worker_converter = None
+_worker_lock = threading.Lock()
+
+
+def _init_worker(conversion, custom_dicts, select_candidates, custom_on_output):
+    global _worker_converter
+    _worker_converter = OpenCC(conversion, custom_dicts=custom_dicts,
+                               select_candidates=select_candidates,
+                               custom_on_output=custom_on_output)
+
+
+def _worker_convert(string):
+    return _worker_converter.convert(string)
 
 
 class OpenCC:
-    def __init__(self, conversion=None):
+    def __init__(self, conversion=None, registry=None, segment_cache=None,
+                 custom_dicts=None, stats=None, fuse_chain=True,
+                 select_candidates=False, custom_on_output=False):
         """
         init OpenCC
         :param conversion: the conversion of usage, options are
          'hk2s', 's2hk', 's2t', 's2tw', 's2twp', 't2hk', 't2s', 't2tw', 'tw2s', 'tw2sp', etc
          check the json file names in config directory
+        :param registry: the DictRegistry to load dictionaries from, defaults
+         to the process-wide dict_registry
+        :param segment_cache: an optional SegmentCache used to memoize the
+         conversion of repeated segments
+        :param custom_dicts: optional list of user dictionaries, each a dict
+         or the path of a txt or compiled dictionary, see set_custom_dicts
+        :param stats: an optional ConversionStats recording where conversion
+         spends its time
+        :param fuse_chain: fold stages made of single character dictionaries
+         into the stage before them, so they take no matching pass of their
+         own. The result is the same as running every stage in turn.
+        :param select_candidates: choose among the candidates of entries
+         that have several, e.g. 了 -> 了 瞭, from their context instead of
+         always taking the first, see CandidateSelector. This applies to
+         the stage holding the segmentation dictionary of the config.
+        :param custom_on_output: match custom_dicts against the converted
+         text after the last stage instead of the original text, like a
+         replacement pass over the output, so their keys are written in
+         converted form and the conversion of the text around a match does
+         not change. See set_custom_dicts.
         :return: None
         """
         self.conversion_name = ''
@@ -46,7 +614,25 @@ class OpenCC:
         self._dict_init_done = False
         self._dict_chain = list()
         self._dict_chain_data = list()
-        self.dict_cache = dict()
+        self.registry = registry if registry is not None else dict_registry
+        self.segment_cache = segment_cache
+        self.stats = stats
+        self.fuse_chain = fuse_chain
+        self.select_candidates = select_candidates
+        self.custom_dicts = list(custom_dicts) if custom_dicts else []
+        self.custom_on_output = custom_on_output
+        # DictGroup of custom keys matched over the whole text instead of
+        # within segments, see set_custom_dicts
+        self._text_custom = None
+        self._chain_key = conversion
+        # Union of the characters keys of every stage start with
+        self._chain_first_chars = None
+        # Union of the characters keys of every stage contain, see _stream_cut
+        self._chain_key_chars = None
+        # Number of segments and characters converted, and how many of them
+        # went through unchanged because no key could match
+        self.counters = {'segments': 0, 'chars': 0,
+                         'fast_path_segments': 0, 'fast_path_chars': 0}
         # List of sentence separators from OpenCC PhraseExtract.cpp. None of these separators are allowed as
         # part of a dictionary entry
         self.split_chars_re = re.compile(
@@ -61,21 +647,350 @@ class OpenCC:
         if not self._dict_init_done:
             self._init_dict()
             self._dict_init_done = True
+        if self._text_custom is None:
+            return self._convert_text(string)
+        if self.custom_on_output:
+            return self._apply_text_custom(self._convert_text(string), False)
+        # Keys holding separators are matched over the original text first,
+        # the text between their matches converts on its own
+        return "".join(piece if final else self._convert_text(piece)
+                       for piece, final in self._apply_text_custom(string, True))
 
+    def _apply_text_custom(self, string, pieces):
+        """
+        Match the custom keys of _text_custom over a whole text
+        :param pieces: return DictGroup.convert_pieces instead of a string
+        """
+        stats = self.stats
+        if stats is not None:
+            start = stats.timer()
+        if pieces:
+            result = self._text_custom.convert_pieces(string)
+        else:
+            result = self._text_custom.convert(string)
+        if stats is not None:
+            stats.add_time('custom', stats.timer() - start)
+        return result
+
+    def _convert_text(self, string):
+        """
+        Convert string with the conversion chain, segment by segment
+        """
+        # Every step is timed into stats if set; the checks are all it costs
+        # otherwise
+        stats = self.stats
         result = []
+        cache = self.segment_cache
+        chain_chars = self._chain_first_chars
+        if chain_chars is None:
+            chain_chars = self._prepare_chain()
+        if stats is not None:
+            timer = stats.timer
+            start = timer()
+        counters = self.counters
+        fast_segments = 0
+        fast_chars = 0
         # Separate string using the list of separators in a regular expression
         split_string_list = self.split_chars_re.split(string)
+        if stats is not None:
+            stats.add_time('split', timer() - start)
         for i in range(0, len(split_string_list)):
             if i % 2 == 0:
                 # Work with the text string
                 # Append converted string to result
-                result.append(self._convert(split_string_list[i], self._dict_chain_data))
+                segment = split_string_list[i]
+                if stats is not None:
+                    stats.add_segment(len(segment))
+                    start = timer()
+                    disjoint = chain_chars.isdisjoint(segment)
+                    stats.add_time('fast_path_check', timer() - start)
+                else:
+                    disjoint = chain_chars.isdisjoint(segment)
+                if disjoint:
+                    # No key of any stage starts with a character of the
+                    # segment, so it passes through unchanged
+                    result.append(segment)
+                    fast_segments += 1
+                    fast_chars += len(segment)
+                    continue
+                converted = None
+                if cache is not None:
+                    if stats is not None:
+                        start = timer()
+                    converted = cache.get(self._chain_key, segment)
+                    if stats is not None:
+                        stats.add_time('cache', timer() - start)
+                if converted is None:
+                    if stats is not None:
+                        start = timer()
+                    converted = self._convert(segment, self._dict_chain_data)
+                    if stats is not None:
+                        stats.add_time('stages', timer() - start)
+                    if cache is not None:
+                        cache.put(self._chain_key, segment, converted)
+                result.append(converted)
             else:
                 # Work with the separator
                 # Append separator string to converted_string
                 result.append(split_string_list[i])
+        counters['segments'] += (len(split_string_list) + 1) // 2
+        counters['chars'] += len(string)
+        counters['fast_path_segments'] += fast_segments
+        counters['fast_path_chars'] += fast_chars
         # Join it all together to return a result
-        return "".join(result)
+        if stats is None:
+            return "".join(result)
+        start = timer()
+        result = "".join(result)
+        stats.add_time('join', timer() - start)
+        return result
+
+    def _prepare_chain(self):
+        """
+        Fuse the chain if enabled, and collect the characters keys of any
+        stage start with. The time taken is recorded under 'init'
+        :return: frozenset of characters
+        """
+        if self.stats is not None:
+            start = self.stats.timer()
+        if self.fuse_chain:
+            self._dict_chain_data = self._fuse_stages(self._dict_chain_data)
+        self._chain_first_chars = frozenset().union(
+            *[group.first_chars for group in self._dict_chain_data])
+        if self.stats is not None:
+            self.stats.add_time('init', self.stats.timer() - start)
+        return self._chain_first_chars
+
+    def _fuse_stages(self, stages):
+        """
+        Fold every stage whose dictionaries only have single character keys
+        into the stage before it. Such a stage maps each character of its
+        input on its own, so it can be applied to the values of the previous
+        stage and to the characters that stage leaves unmatched instead.
+        Other stages can match across the replacements of the stage before
+        them and are kept as they are.
+        :param stages: list of LazyDictGroup
+        :return: list of LazyDictGroup
+        """
+        fused = []
+        for stage in stages:
+            if fused and not stage.custom and not stage.tails and all(
+                    self.registry.get_max_len(path) == 1 for path in stage.paths):
+                previous = fused[-1]
+                fused[-1] = LazyDictGroup(self.registry, previous.paths, previous.custom,
+                                          previous.tails + [stage.paths],
+                                          previous.segmentation)
+            else:
+                fused.append(stage)
+        return fused
+
+    def convert_many(self, strings, workers=None, chunksize=1):
+        """
+        Convert several strings using a pool of worker processes
+        :param strings: iterable of strings
+        :param workers: the number of worker processes, defaults to the
+                        number of CPUs. 1 converts in this process.
+        :param chunksize: the number of strings sent to a worker at a time
+        :return: list of converted strings, in the order of strings
+        """
+        global _worker_converter
+        strings = list(strings)
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = min(workers, len(strings))
+        if workers <= 1:
+            return [self.convert(string) for string in strings]
+        # Build every stage before the workers fork so they share it
+        self.load_dictionaries()
+
+        if (hasattr(multiprocessing, 'get_context') and
+                'fork' in multiprocessing.get_all_start_methods()):
+            # Workers inherit this converter and its dictionaries
+            context = multiprocessing.get_context('fork')
+            initializer, initargs = None, ()
+        else:
+            # Each worker loads the dictionaries once when it starts
+            context = multiprocessing
+            initializer, initargs = _init_worker, (self.conversion,
+                                                   self.custom_dicts,
+                                                   self.select_candidates,
+                                                   self.custom_on_output)
+
+        with _worker_lock:
+            _worker_converter = self
+            try:
+                pool = context.Pool(workers, initializer, initargs)
+            finally:
+                _worker_converter = None
+        try:
+            return pool.map(_worker_convert, strings, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    def convert_keys(self, keys):
+        """
+        Convert many short strings, such as dictionary keys, in one pass.
+        They are joined with newlines, which are separators, so the result
+        is the same as converting every key on its own.
+        :param keys: iterable of strings
+        :return: list of converted strings, in the order of keys
+        """
+        keys = list(keys)
+        if not keys:
+            return []
+        joined = '\n'.join(keys)
+        if joined.count('\n') == len(keys) - 1:
+            converted = self.convert(joined).split('\n')
+            if len(converted) == len(keys):
+                return converted
+        # A key or a dictionary value holds a newline
+        return [self.convert(key) for key in keys]
+
+    def iter_chunks(self, string, size):
+        """
+        Cut a string into pieces of about size characters, each ending right
+        after a separator, so converting the pieces one by one gives the same
+        result as converting the string. A piece only grows past size when
+        there is no separator to cut at.
+        :param string: the input string
+        :param size: the wanted number of characters per piece
+        :return: generator of strings
+        """
+        start = 0
+        string_len = len(string)
+        while string_len - start > size:
+            cut = 0
+            for match in self.split_chars_re.finditer(string, start, start + size):
+                cut = match.end()
+            if not cut:
+                match = self.split_chars_re.search(string, start + size)
+                if match is None:
+                    break
+                cut = match.end()
+            yield string[start:cut]
+            start = cut
+        if start < string_len:
+            yield string[start:]
+
+    def iter_convert(self, chunks, max_buffer=DEFAULT_STREAM_BUFFER):
+        """
+        Convert text arriving in chunks, yielding converted pieces as soon as
+        they are complete. Text is cut right after a separator, so the output
+        is the same as converting the joined chunks in one go.
+        Text with no separator for more than max_buffer characters is cut
+        right after a character no key of any stage contains, which converts
+        like a separator, or failing that where no key of any stage occurs
+        across the cut. Later stages match the output of earlier ones, so in
+        that last case they could still match across it and the output may
+        differ. Custom keys matched over the whole text, see
+        set_custom_dicts, are never cut through.
+        :param chunks: iterable of strings
+        :param max_buffer: the number of characters to hold while waiting
+                           for a separator
+        :return: generator of converted strings
+        """
+        if not self._dict_init_done:
+            self._init_dict()
+            self._dict_init_done = True
+        if self._text_custom is not None and self.custom_on_output:
+            # The custom keys match the converted text, which is streamed
+            # through them in turn
+            return self._iter_text_custom(
+                self._iter_chain(chunks, max_buffer, self._convert_text))
+        return self._iter_chain(chunks, max_buffer, self.convert)
+
+    def _iter_chain(self, chunks, max_buffer, convert):
+        """
+        Cut text arriving in chunks for the conversion chain, see iter_convert
+        :param convert: the function converting each piece
+        :return: generator of converted strings
+        """
+        spanning = self._text_custom if not self.custom_on_output else None
+        pending = ''
+        for chunk in chunks:
+            pending += chunk
+            cuts = [match.end() for match in self.split_chars_re.finditer(pending)]
+            if not cuts and len(pending) > max_buffer:
+                cuts = [self._stream_cut(pending)]
+            cut = cuts[-1] if cuts else 0
+            if cut and spanning is not None:
+                cut = self._custom_cut(pending, cuts)
+            if cut:
+                yield convert(pending[:cut])
+                pending = pending[cut:]
+        if pending:
+            yield convert(pending)
+
+    def _iter_text_custom(self, pieces):
+        """
+        Match the keys of _text_custom over converted text arriving in pieces
+        :return: generator of strings
+        """
+        pending = ''
+        for piece in pieces:
+            pending += piece
+            cut = self._custom_cut(pending, range(len(pending) + 1))
+            if cut:
+                yield self._apply_text_custom(pending[:cut], False)
+                pending = pending[cut:]
+        if pending:
+            yield self._apply_text_custom(pending, False)
+
+    def _custom_cut(self, string, cuts):
+        """
+        Find where text can be cut without cutting through a match of the
+        keys of _text_custom, or through one more text could still make
+        :param string: the text held
+        :param cuts: the positions string may otherwise be cut at, ascending
+        :return: the last of cuts that qualifies, 0 if there is none
+        """
+        limit = len(string) - self._text_custom.max_len + 1
+        matches = self._text_custom.match(string)
+        starts = [start for start, _, _, _ in matches]
+        for cut in reversed(cuts):
+            if cut > limit:
+                continue
+            # The last match starting before the cut must end before it
+            index = bisect_left(starts, cut) - 1
+            if index < 0 or matches[index][1] <= cut:
+                return cut
+        return 0
+
+    def _stream_cut(self, string):
+        """
+        Find where iter_convert can cut text with no separator, leaving the
+        last max key length characters, which more text could extend
+        :param string: the text held, which contains no separators
+        :return: the position to cut at, 0 if there is none
+        """
+        if self._chain_first_chars is None:
+            self._prepare_chain()
+        groups = [stage.load() for stage in self._dict_chain_data]
+        end = len(string) - max([group.max_len for group in groups] + [1])
+        if self._chain_key_chars is None:
+            self._chain_key_chars = frozenset().union(
+                *[group.key_chars() for group in groups])
+        key_chars = self._chain_key_chars
+        for pos in range(end, 0, -1):
+            if string[pos - 1] not in key_chars:
+                return pos
+        for pos in range(end, 0, -1):
+            if not any(group.spans(string, pos) for group in groups):
+                return pos
+        return 0
+
+    def convert_stream(self, readable, writable, chunk_size=DEFAULT_STREAM_CHUNK):
+        """
+        Convert a text stream into another one with bounded memory
+        :param readable: text file object to read from
+        :param writable: text file object to write to
+        :param chunk_size: the number of characters to read at a time
+        :return: None
+        """
+        chunks = iter(lambda: readable.read(chunk_size), '')
+        for converted in self.iter_convert(chunks):
+            writable.write(converted)
 
     def _convert(self, string, dictionary = []):
         """
@@ -83,14 +998,31 @@ class OpenCC:
         If a dictionary is part of a group of dictionaries, stop conversion on a word
         after the first match is found.
         :param string: the input string
-        :param dictionary: list of dictionaries to be applied against the string
+        :param dictionary: list of LazyDictGroup to be applied against the string
         :return: converted string
         """
-        tree = StringTree(string)
-        for c_dict in dictionary:
-            tree.create_parse_tree(c_dict)
-            tree = StringTree("".join(tree.inorder()))
-        return "".join(tree.inorder())
+        stats = self.stats
+        if len(dictionary) < 2 or not dictionary[0].final:
+            # Final matches only matter to the groups after the first
+            for group in dictionary:
+                string = group.convert(string, stats)
+            return string
+
+        # Matches of custom dictionaries are final: the text between them
+        # goes through the rest of the chain on its own
+        result = []
+        run = []
+        for piece, final in dictionary[0].convert_pieces(string, stats):
+            if final:
+                if run:
+                    result.append(self._convert("".join(run), dictionary[1:]))
+                    run = []
+                result.append(piece)
+            else:
+                run.append(piece)
+        if run:
+            result.append(self._convert("".join(run), dictionary[1:]))
+        return "".join(result)
 
     def _init_dict(self):
         """
@@ -99,6 +1031,8 @@ class OpenCC:
         """
         if self.conversion is None:
             raise ValueError('conversion is not set')
+        if self.stats is not None:
+            start = self.stats.timer()
 
         self._dict_chain = []
         config = self.conversion + '.json'
@@ -111,39 +1045,124 @@ class OpenCC:
         for chain in setting_json.get('conversion_chain'):
             self._add_dict_chain(self._dict_chain, chain.get('dict'))
 
+        # Make sure all dictionaries are in a list. Each group is compiled
+        # into a single matching table the first time a segment needs it.
         self._dict_chain_data = []
-        self._add_dictionaries(self._dict_chain, self._dict_chain_data)
-        # Make sure all dictionaries are in a list
-        for index, c_dict in enumerate(self._dict_chain_data):
-           if isinstance(c_dict, tuple):
-               self._dict_chain_data[index] = [c_dict]
+        for item in self._dict_chain:
+            if not isinstance(item, list):
+                item = [item]
+            self._dict_chain_data.append(LazyDictGroup(self.registry, item))
+
+        self._chain_key = self.conversion
+        segmentation = setting_json.get('segmentation', {}).get('dict')
+        if self.select_candidates and segmentation and self._dict_chain_data:
+            # The segmentation dictionary gives the context the candidates
+            # of its stage are chosen by
+            chain = []
+            self._add_dict_chain(chain, segmentation)
+            stages = [index for index, stage in enumerate(self._dict_chain_data)
+                      if chain[0] in stage.paths] + [0]
+            stage = self._dict_chain_data[stages[0]]
+            self._dict_chain_data[stages[0]] = LazyDictGroup(
+                self.registry, stage.paths, segmentation=chain[0])
+            self._chain_key = (self.conversion, 'candidates')
+
+        self._text_custom = None
+        if self.custom_dicts and self.custom_on_output:
+            # Matched over the whole converted text after the chain
+            self._text_custom = DictGroup([], custom=[
+                self._custom_matcher(self._custom_table(item)) for item in self.custom_dicts])
+        elif self.custom_dicts and self._dict_chain_data:
+            # Custom dictionaries take priority over the first group and are
+            # matched in the same pass, sharing its compiled table. Keys
+            # holding separators never occur within a segment and are
+            # matched over the whole text before it is split.
+            custom = []
+            spanning = []
+            for item in self.custom_dicts:
+                table = self._custom_table(item)
+                custom.append(self._custom_matcher(table))
+                spanning.append(self._spanning_keys(table))
+            if any(spanning):
+                self._text_custom = DictGroup([], custom=[CompactTrie(keys) for keys in spanning])
+            self._dict_chain_data[0] = LazyDictGroup(
+                self.registry, self._dict_chain_data[0].paths, custom,
+                segmentation=self._dict_chain_data[0].segmentation)
+            self._chain_key = (self.conversion, next(_custom_chain_ids))
+        self._chain_first_chars = None
+        self._chain_key_chars = None
+        # Segments converted with the previous chain are stale
+        if self.segment_cache is not None:
+            self.segment_cache.clear()
         self._dict_init_done = True
+        if self.stats is not None:
+            self.stats.add_time('init', self.stats.timer() - start)
 
-    def _add_dictionaries(self, chain_list, chain_data):
-        for item in chain_list:
-            if isinstance(item, list):
-                chain = []
-                self._add_dictionaries(item, chain)
-                chain_data.append(chain)
-            else:
-                if not item in self.dict_cache:
-                    map_dict = {}
-                    # Default max key length to smallest possible value
-                    max_len = 1
-                    # Default min key length to very large value
-                    min_len = 1000
-                    with io.open(item, "r", encoding="utf-8") as f:
-                        for line in f:
-                            key, value = line.strip().split('\t')
-                            map_dict[key] = value
-                            if len(key) > max_len:
-                                max_len = len(key)
-                            if len(key) < min_len:
-                                min_len = len(key)
-                    chain_data.append((max_len, min_len, map_dict))
-                    self.dict_cache[item] = (max_len, min_len, map_dict)
-                else:
-                    chain_data.append(self.dict_cache[item])
+    def load_dictionaries(self):
+        """
+        Build every stage of the conversion chain now instead of when a
+        segment first needs it
+        :return: None
+        """
+        if not self._dict_init_done:
+            self._init_dict()
+            self._dict_init_done = True
+        if self._chain_first_chars is None:
+            self._prepare_chain()
+        for group in self._dict_chain_data:
+            group.load()
+
+    def _custom_table(self, item):
+        """
+        :param item: a dict, or the path of a txt or compiled dictionary
+        :return: a dict, or the ocd.BinaryDict of a compiled dictionary,
+                 which is searched in place instead of being loaded
+        """
+        if isinstance(item, dict):
+            return item
+        if item.endswith(ocd.EXTENSION):
+            return ocd.load(item)[2]
+        return self.registry.get_custom_dict(item)
+
+    @staticmethod
+    def _custom_matcher(table):
+        """
+        :param table: a dict or ocd.BinaryDict, see _custom_table
+        :return: CompactTrie, or the ocd.BinaryDict itself
+        """
+        if isinstance(table, ocd.BinaryDict):
+            return table
+        return CompactTrie(table)
+
+    def _spanning_keys(self, table):
+        """
+        :param table: a dict or ocd.BinaryDict, see _custom_table
+        :return: dict of the entries whose keys hold separators
+        """
+        if isinstance(table, ocd.BinaryDict):
+            return table.search_keys(separator_chars(self.split_chars_re))
+        split = self.split_chars_re.search
+        return dict((key, value) for key, value in table.items() if split(key))
+
+    def set_custom_dicts(self, custom_dicts):
+        """
+        set the user dictionaries applied before the conversion chain. Their
+        keys are matched against the original text, leftmost-longest and with
+        priority over the built-in dictionaries, and their values are output
+        as is. Keys holding separators, such as names like "Harry Potter",
+        are matched over the whole text before it is split into segments,
+        ahead of the other keys.
+        With custom_on_output, the keys are instead matched leftmost-longest
+        against the converted text, separators included, and replaced by
+        their values.
+        :param custom_dicts: list of dicts or txt dictionary paths, earlier
+         ones taking priority. A compiled dictionary path (see ocd.py) is
+         searched through mmap, so a very large dictionary is not held in
+         memory.
+        :return: None
+        """
+        self.custom_dicts = list(custom_dicts) if custom_dicts else []
+        self._dict_init_done = False
 
     def _add_dict_chain(self, dict_chain, dict_dict):
         """
@@ -158,7 +1177,8 @@ class OpenCC:
             for dict_item in dict_dict.get('dicts'):
                 self._add_dict_chain(chain, dict_item)
             dict_chain.append(chain)
-        elif dict_dict.get('type') == 'txt':
+        elif dict_dict.get('type') in ('txt', 'ocb'):
+            # 'ocb' is a compiled dictionary, see ocd.py
             filename = dict_dict.get('file')
             dict_file = os.path.join(os.path.dirname(__file__), DICT_DIR, filename)
             dict_chain.append(dict_file)
@@ -179,6 +1199,807 @@ class OpenCC:
 
 #############################################
 
+class DictGroup(object):
+    """
+    A dictionary group compiled into one prefix table so a segment can be
+    converted with a single left-to-right scan instead of probing every
+    substring length at every offset.
+
+    The result is identical to running StringTree.create_parse_tree over the
+    group: within a group, earlier dictionaries win, then longer keys, then
+    the leftmost occurrence, and a character is only matched once per group.
+    """
+
+    def __init__(self, test_dict_list, custom=None, base=None, tails=()):
+        """
+        :param test_dict_list: a list of tuples of the max key length, min key
+                               length and dict, in group priority order.
+                               Compiled dictionaries (ocd.BinaryDict) are
+                               searched in place at every offset instead of
+                               being decoded into the table.
+        :param tails: lists of single character dictionaries, in the same
+                      form as test_dict_list, of the stages following this
+                      one. They are applied to the values of this group and,
+                      with the lowest priority, to unmatched characters.
+        :param custom: optional list of CompactTrie or ocd.BinaryDict
+                       matched with priority over test_dict_list. Their
+                       matches are final: they are not converted again by
+                       later groups.
+        :param base: an already compiled DictGroup whose table is shared
+                     instead of compiling test_dict_list
+        """
+        self.custom = list(custom) if custom else []
+        self.final = len(self.custom)
+        self.max_len = max([trie.max_len for trie in self.custom] + [0])
+        # The arrays _match_custom walks for each custom dictionary, looked
+        # up once instead of at every offset
+        self._walks = []
+        for priority, trie in enumerate(self.custom):
+            if isinstance(trie, CompactTrie):
+                self._walks.append((priority, trie.root, (
+                    trie.first_child, trie.child_count, trie.value_index,
+                    trie.edge_char, trie.edge_node, trie.values)))
+            else:
+                self._walks.append((priority, None, trie))
+        if base is not None:
+            self.table = base.table
+            self.priorities = base.priorities
+            self.char_map = base.char_map
+            self.tail_map = base.tail_map
+            self.binary = base.binary
+            self.max_len = max(self.max_len, base.max_len)
+            return
+        # Maps every key prefix to None, and every key to its first candidate
+        # value. The priority of a key is the index of the dictionary it came
+        # from, only keys not from the first dictionary are in priorities.
+        self.table = {}
+        self.priorities = {}
+        table = self.table
+        priorities = self.priorities
+        char_map = self._compose_tails(tails)
+        translate_map = dict((ord(char), value) for char, value in char_map.items())
+        # What the fused stages make of a segment this group does not match
+        self.tail_map = translate_map
+        # (priority, ocd.BinaryDict) of the compiled dictionaries, so opening
+        # a group of them costs no more than mapping the files
+        self.binary = []
+        for priority, test_dict in enumerate(test_dict_list):
+            if isinstance(test_dict[2], ocd.BinaryDict):
+                self.binary.append((priority, test_dict[2]))
+                self.max_len = max(self.max_len, test_dict[0])
+                continue
+            for key, value in test_dict[2].items():
+                if table.get(key) is not None:
+                    # Already provided by a dictionary earlier in the group
+                    continue
+                for i in range(1, len(key)):
+                    prefix = key[:i]
+                    if prefix not in table:
+                        table[prefix] = None
+                # multiple mapping, use the first one for now
+                value = value.split(' ')[0]
+                if translate_map:
+                    translated = value.translate(translate_map)
+                    if translated != value:
+                        value = translated
+                # Unchanged values stay the string object of the parsed
+                # dictionary, shared by every table built from it
+                table[key] = value
+                if priority:
+                    priorities[key] = priority
+                if len(key) > self.max_len:
+                    self.max_len = len(key)
+        if char_map:
+            # Characters this group leaves unmatched still go through the
+            # fused stages
+            priority = len(test_dict_list)
+            for char, value in char_map.items():
+                if table.get(char) is None:
+                    table[char] = value
+                    priorities[char] = priority
+            self.max_len = max(self.max_len, 1)
+
+        # Single character keys accepted after every longer key can only
+        # fill the gaps left between the other matches, so instead of being
+        # matched they are applied to those gaps with unicode.translate
+        last = max([priorities.get(key, 0) for key, value in table.items()
+                    if value is not None and len(key) > 1] +
+                   [priority for priority, _ in self.binary] + [-1])
+        first_chars = frozenset(key[0] for key in table if len(key) > 1)
+        self.char_map = {}
+        for key, value in list(table.items()):
+            if len(key) == 1 and value is not None and priorities.get(key, 0) >= last:
+                self.char_map[ord(key)] = value
+                priorities.pop(key, None)
+                if key in first_chars:
+                    # Still the start of longer keys
+                    table[key] = None
+                else:
+                    del table[key]
+
+    @staticmethod
+    def _compose_tails(tails):
+        """
+        Compose single character stages into one mapping
+        :param tails: lists of dictionaries, see __init__
+        :return: dict of character to the string it ends up as
+        """
+        char_map = {}
+        for tail in tails:
+            step = {}
+            # Earlier dictionaries of a group take priority
+            for test_dict in reversed(tail):
+                for key, value in test_dict[2].items():
+                    step[key] = value.split(' ')[0]
+            translate_map = dict((ord(char), value) for char, value in step.items())
+            for char, value in char_map.items():
+                char_map[char] = value.translate(translate_map)
+            for char, value in step.items():
+                char_map.setdefault(char, value)
+        return dict((char, value) for char, value in char_map.items() if value != char)
+
+    def match(self, string):
+        """
+        Find the matches of this group in a segment, leaving out the single
+        characters handled by char_map.
+        :param string: the input string, which contains no separators
+        :return: list of (start, end, priority, value) sorted by start
+        """
+        table = self.table
+        priorities = self.priorities
+        string_len = len(string)
+        matches = []
+        if self.custom:
+            # Custom matches never overlap and rank first, so all of them are
+            # accepted and the other dictionaries only match between them
+            accepted = []
+            spans = []
+            pos = 0
+            for priority, neg_len, start, value in self._match_custom(string):
+                if start > pos:
+                    spans.append((pos, start))
+                pos = start - neg_len
+                accepted.append((start, pos, priority, value))
+            if pos < string_len:
+                spans.append((pos, string_len))
+            offset = self.final
+        else:
+            accepted = []
+            spans = [(0, string_len)]
+            offset = 0
+        # Collect every key occurrence in one pass, walking the prefix table
+        # from each offset for as long as the substring stays a key prefix
+        for span_start, span_end in (spans if table else ()):
+            for i in range(span_start, span_end):
+                j = i + 1
+                while j <= span_end:
+                    key = string[i:j]
+                    value = table.get(key, False)
+                    if value is False:
+                        break
+                    if value is not None:
+                        if priorities:
+                            matches.append((priorities.get(key, 0) + offset, i - j, i, value))
+                        else:
+                            matches.append((offset, i - j, i, value))
+                    j += 1
+        tail_map = self.tail_map
+        for priority, binary in self.binary:
+            first_chars = binary.first_chars()
+            for span_start, span_end in spans:
+                for i in range(span_start, span_end):
+                    if string[i] in first_chars:
+                        for length, value in binary.prefixes(string, i):
+                            if i + length > span_end:
+                                break
+                            if tail_map:
+                                value = value.translate(tail_map)
+                            matches.append((priority + offset, -length, i, value))
+        if not matches:
+            return accepted
+
+        # Accept occurrences by priority, longest first, then leftmost, as
+        # long as they do not overlap anything already matched
+        matches.sort()
+        covered = bytearray(string_len)
+        remaining = sum(span_end - span_start for span_start, span_end in spans)
+        for priority, neg_len, start, value in matches:
+            end = start - neg_len
+            if covered.find(b'\x01', start, end) == -1:
+                covered[start:end] = b'\x01' * (end - start)
+                accepted.append((start, end, priority, value))
+                remaining += neg_len
+                if not remaining:
+                    break
+        accepted.sort()
+        return accepted
+
+    def _match_custom(self, string):
+        """
+        Match the custom dictionaries together leftmost-longest, like the
+        trie pass they replace: at every offset not covered yet the longest
+        key wins, the earliest dictionary on keys of equal length. Their
+        matches never overlap, so match accepts all of them.
+        :return: list of (priority, -length, start, value)
+        """
+        matches = []
+        string_len = len(string)
+        i = 0
+        while i < string_len:
+            best_len = 0
+            char = string[i]
+            for priority, root, walk in self._walks:
+                if root is None:
+                    # A compiled dictionary searched in place
+                    if char in walk.first_chars():
+                        found = walk.prefixes(string, i)
+                        if found and found[-1][0] > best_len:
+                            best_len, value = found[-1]
+                            best = priority
+                    continue
+                node = root.get(char)
+                if node is None:
+                    continue
+                # Same walk as CompactTrie.prefixes, inlined as this runs at
+                # every offset of every segment
+                first_child, child_count, value_index, edge_char, edge_node, values = walk
+                pos = i + 1
+                while True:
+                    index = value_index[node]
+                    if index >= 0 and pos - i > best_len:
+                        best_len = pos - i
+                        value = values[index]
+                        best = priority
+                    count = child_count[node]
+                    if not count or pos == string_len:
+                        break
+                    lo = first_child[node]
+                    code = ord(string[pos])
+                    if count == 1:
+                        # Most nodes past the first characters have one child
+                        if edge_char[lo] != code:
+                            break
+                        node = edge_node[lo]
+                    else:
+                        k = bisect_left(edge_char, code, lo, lo + count)
+                        if k == lo + count or edge_char[k] != code:
+                            break
+                        node = edge_node[k]
+                    pos += 1
+            if best_len:
+                matches.append((best, -best_len, i, value))
+                i += best_len
+            else:
+                i += 1
+        return matches
+
+    def probe_count(self, string):
+        """
+        Count the table lookups match makes for a segment, for ConversionStats.
+        A compiled dictionary counts one per offset it is searched at.
+        :param string: the input string, which contains no separators
+        :return: int
+        """
+        table = self.table
+        string_len = len(string)
+        probes = 0
+        for i in range(string_len):
+            j = i + 1
+            while j <= string_len:
+                probes += 1
+                if table.get(string[i:j], False) is False:
+                    break
+                j += 1
+        for _, binary in self.binary:
+            first_chars = binary.first_chars()
+            probes += sum(1 for char in string if char in first_chars)
+        return probes
+
+    def spans(self, string, pos):
+        """
+        Whether a key of this group occurs in a segment across a position,
+        in which case the two sides may not convert the same on their own
+        :param string: the input string, which contains no separators
+        :param pos: the position to cut string at
+        :return: bool
+        """
+        table = self.table
+        string_len = len(string)
+        for i in range(max(0, pos - self.max_len + 1), pos):
+            j = i + 1
+            while j <= string_len:
+                value = table.get(string[i:j], False)
+                if value is False:
+                    break
+                if value is not None and j > pos:
+                    return True
+                j += 1
+        for trie in self.custom + [binary for _, binary in self.binary]:
+            for i in range(max(0, pos - trie.max_len + 1), pos):
+                if any(i + length > pos for length, _ in trie.prefixes(string, i)):
+                    return True
+        return False
+
+    def key_chars(self):
+        """
+        :return: frozenset of the characters the keys of this group contain
+        """
+        chars = set("".join(self.table))
+        chars.update(unichr(char) for char in self.char_map)
+        for trie in self.custom + [binary for _, binary in self.binary]:
+            if isinstance(trie, CompactTrie):
+                chars.update(unichr(char) for char in trie.edge_char)
+            else:
+                chars.update("".join(trie.keys()))
+        return frozenset(chars)
+
+    def convert(self, string, accepted=None):
+        """
+        Convert a segment with this group.
+        :param string: the input string, which contains no separators
+        :param accepted: the result of match(string) if already known
+        :return: converted string
+        """
+        if accepted is None:
+            accepted = self.match(string)
+        char_map = self.char_map
+        if not accepted:
+            return string.translate(char_map) if char_map else string
+        result = []
+        pos = 0
+        for start, end, _, value in accepted:
+            if start > pos:
+                result.append(string[pos:start].translate(char_map))
+            result.append(value)
+            pos = end
+        if pos < len(string):
+            result.append(string[pos:].translate(char_map))
+        return "".join(result)
+
+    def convert_pieces(self, string, accepted=None):
+        """
+        Convert a segment with this group, keeping matches of the final
+        dictionaries apart.
+        :param string: the input string, which contains no separators
+        :param accepted: the result of match(string) if already known
+        :return: list of (string, is final match)
+        """
+        if accepted is None:
+            accepted = self.match(string)
+        char_map = self.char_map
+        result = []
+        pos = 0
+        for start, end, priority, value in accepted:
+            if start > pos:
+                result.append((string[pos:start].translate(char_map), False))
+            result.append((value, priority < self.final))
+            pos = end
+        if pos < len(string):
+            result.append((string[pos:].translate(char_map), False))
+        return result
+
+class LazyDictGroup(object):
+    """
+    A stage of the conversion chain whose DictGroup is only compiled the
+    first time a segment needs it. Segments containing none of the
+    characters the stage's keys start with are returned as is, without
+    loading the stage at all.
+    """
+
+    def __init__(self, registry, paths, custom=None, tails=None, segmentation=None):
+        """
+        :param registry: the DictRegistry to load dictionaries from
+        :param paths: the dictionary files, in group priority order
+        :param custom: optional list of CompactTrie or ocd.BinaryDict, see
+                       DictGroup
+        :param tails: optional lists of dictionary files of the single
+                      character stages fused into this one, see DictGroup
+        :param segmentation: optional segmentation dictionary file. If
+                             given, the candidates of entries that have
+                             several are chosen by a CandidateSelector.
+        """
+        self.registry = registry
+        self.paths = paths
+        self.tails = list(tails) if tails else []
+        self.custom = list(custom) if custom else []
+        self.final = len(self.custom)
+        self.segmentation = segmentation
+        self._first_chars = None
+        self._base_chars = None
+        self._group = None
+        self._selector = None
+
+    @property
+    def first_chars(self):
+        if self._first_chars is None:
+            chars = set(self.base_chars)
+            for path in sum(self.tails, []):
+                chars.update(self.registry.get_first_chars(path))
+            self._first_chars = frozenset(chars)
+        return self._first_chars
+
+    @property
+    def base_chars(self):
+        """
+        The characters keys start with, leaving out the fused stages
+        """
+        if self._base_chars is None:
+            chars = set()
+            for path in self.paths:
+                chars.update(self.registry.get_first_chars(path))
+            for trie in self.custom:
+                chars.update(trie.first_chars())
+            self._base_chars = frozenset(chars)
+        return self._base_chars
+
+    @property
+    def max_len(self):
+        return self.load().max_len
+
+    @property
+    def name(self):
+        """
+        The dictionary file names of the stage, as used by ConversionStats
+        """
+        name = '+'.join(os.path.basename(path) for path in self.paths)
+        if self.custom:
+            name += '+custom'
+        for tail in self.tails:
+            name += '>' + '+'.join(os.path.basename(path) for path in tail)
+        return name
+
+    @property
+    def loaded(self):
+        return self._group is not None
+
+    @property
+    def selector(self):
+        """
+        The CandidateSelector of the stage, or None
+        """
+        self.load()
+        return self._selector
+
+    def load(self, stats=None):
+        """
+        :param stats: optional ConversionStats to record load times in
+        :return: the compiled DictGroup
+        """
+        if self._group is None:
+            if stats is not None:
+                timer = stats.timer
+                for path in self.paths + sum(self.tails, []):
+                    start = timer()
+                    self.registry.get_dict(path)
+                    stats.add_load(os.path.basename(path), timer() - start)
+                start = timer()
+            group = self.registry.get_group(self.paths, self.tails)
+            if self.custom:
+                group = DictGroup([], custom=self.custom, base=group)
+            if self.segmentation is not None:
+                self._selector = self.registry.get_selector(
+                    self.paths, self.segmentation, self.tails)
+            self._group = group
+            if stats is not None:
+                stats.add_load(self.name, timer() - start)
+        return self._group
+
+    def match(self, string):
+        if self.first_chars.isdisjoint(string):
+            return []
+        return self.load().match(string)
+
+    def convert(self, string, stats=None):
+        """
+        :param stats: optional ConversionStats to record the stage in
+        :return: converted string
+        """
+        return self._apply(string, False, stats)
+
+    def convert_pieces(self, string, stats=None):
+        """
+        :param stats: optional ConversionStats to record the stage in
+        :return: list of (string, is final match), see DictGroup.convert_pieces
+        """
+        return self._apply(string, True, stats)
+
+    def _apply(self, string, pieces, stats):
+        if self.first_chars.isdisjoint(string):
+            if stats is not None:
+                stats.add_stage(self.name, len(string), skipped=True)
+            if pieces:
+                return [(string, False)] if string else []
+            return string
+        group = self.load(stats)
+        if stats is not None:
+            start = stats.timer()
+        if self.tails and self.base_chars.isdisjoint(string):
+            # Only the fused single character stages apply
+            accepted = None
+            result = string.translate(group.tail_map)
+            if pieces:
+                result = [(result, False)]
+        else:
+            accepted = group.match(string)
+            if self._selector is not None:
+                result = self._selector.convert_pieces(group, string, accepted)
+                if not pieces:
+                    result = "".join(piece for piece, _ in result)
+            elif pieces:
+                result = group.convert_pieces(string, accepted)
+            else:
+                result = group.convert(string, accepted)
+        if stats is not None:
+            seconds = stats.timer() - start
+            if accepted is None:
+                stats.add_stage(self.name, len(string), seconds)
+            else:
+                stats.add_stage(self.name, len(string), seconds, len(accepted),
+                                group.probe_count(string))
+        return result
+
+
+class CandidateSelector(object):
+    """
+    Chooses among the candidates of the entries of a stage that have
+    several, such as 了 -> 了 瞭, instead of always taking the first.
+
+    A segment is cut into the matches of the stage and the text between
+    them, as DictGroup.match segments it. The candidates are then chosen
+    together by dynamic programming over that sequence: a choice scores the
+    context weight of the two characters meeting at each of its ends, less
+    PENALTY for every place it stands behind the first candidate, so the
+    first candidate is kept unless the context favours another one.
+
+    The context table holds the weight of every pair of adjacent characters
+    in the values of the segmentation dictionary, the phrases of the
+    conversion, counting only the pairs a candidate can take part in.
+    """
+
+    # Score given up for each place a candidate stands behind the first one
+    PENALTY = 0.5
+
+    def __init__(self, alternates, segmentation, tail_map=None):
+        """
+        :param alternates: dict of key to the tuple of all its candidates
+        :param segmentation: dict of the segmentation dictionary
+        :param tail_map: translate map of the stages fused into the stage,
+                         see DictGroup
+        """
+        if tail_map:
+            alternates = dict((key, tuple(value.translate(tail_map) for value in candidates))
+                              for key, candidates in alternates.items())
+        self.alternates = alternates
+        # Single character keys, found in the text char_map converts
+        self.chars = frozenset(key for key in alternates if len(key) == 1)
+        ends = set()
+        for candidates in alternates.values():
+            for value in candidates:
+                ends.update((value[:1], value[-1:]))
+        counts = {}
+        for value in segmentation.values():
+            value = value.split(' ')[0]
+            if tail_map:
+                value = value.translate(tail_map)
+            for i in range(len(value) - 1):
+                pair = value[i:i + 2]
+                if pair[0] in ends or pair[1] in ends:
+                    counts[pair] = counts.get(pair, 0) + 1
+        self.context = dict((pair, math.log(1 + count)) for pair, count in counts.items())
+
+    def convert_pieces(self, group, string, accepted=None):
+        """
+        Convert a segment like DictGroup.convert_pieces, choosing among the
+        candidates of the matched entries
+        :param group: the DictGroup of the stage
+        :param string: the input string, which contains no separators
+        :param accepted: the result of group.match(string) if already known
+        :return: list of (string, is final match)
+        """
+        if accepted is None:
+            accepted = group.match(string)
+        alternates = self.alternates
+        chars = self.chars
+        char_map = group.char_map
+        final = group.final
+        # Converted text, or the tuple of candidates of an entry
+        pieces = []
+        choices = False
+        pos = 0
+        for start, end, priority, value in accepted + [(len(string), None, None, None)]:
+            if start > pos:
+                gap = string[pos:start]
+                if chars.isdisjoint(gap):
+                    pieces.append((gap.translate(char_map), False))
+                else:
+                    for char in gap:
+                        candidates = alternates.get(char)
+                        if candidates is None:
+                            pieces.append((char.translate(char_map), False))
+                        else:
+                            pieces.append((candidates, False))
+                            choices = True
+            if end is None:
+                break
+            if priority < final:
+                # Output as is
+                pieces.append((value, True))
+            else:
+                candidates = alternates.get(string[start:end])
+                if candidates is None:
+                    pieces.append((value, False))
+                else:
+                    pieces.append((candidates, False))
+                    choices = True
+            pos = end
+        if choices:
+            self._choose(pieces)
+        return pieces
+
+    def _choose(self, pieces):
+        """
+        Replace every tuple of candidates in pieces with the best of them
+        """
+        context = self.context
+        penalty = self.PENALTY
+        # Best score of the pieces so far ending with each candidate of the
+        # last one, and the candidate of the piece before it that it follows
+        scores = [0.0]
+        previous = ('',)
+        back = []
+        for piece, _ in pieces:
+            candidates = piece if isinstance(piece, tuple) else (piece,)
+            step_scores = []
+            step_back = []
+            for rank, value in enumerate(candidates):
+                best = None
+                for index, before in enumerate(previous):
+                    score = scores[index] + context.get(before[-1:] + value[:1], 0.0)
+                    if best is None or score > best:
+                        best = score
+                        best_index = index
+                step_scores.append(best - penalty * rank)
+                step_back.append(best_index)
+            scores = step_scores
+            previous = candidates
+            back.append(step_back)
+        index = scores.index(max(scores))
+        for position in range(len(pieces) - 1, -1, -1):
+            piece, is_final = pieces[position]
+            if isinstance(piece, tuple):
+                pieces[position] = (piece[index], is_final)
+            index = back[position][index]
+
+
+class CompactTrie(object):
+    """
+    Array backed trie for user dictionaries, built in one pass over the
+    sorted keys. The child edges of a node are contiguous and sorted, and
+    are found by binary search over an array of code points. Values are
+    deduplicated into one pool, so a large dictionary costs a few array
+    slots per node instead of a dict per node.
+    """
+
+    def __init__(self, map_dict):
+        """
+        :param map_dict: dict of key to value, only the first candidate of a
+                         space separated value is kept
+        """
+        keys = sorted(key for key in map_dict if key)
+        self.max_len = max(map(len, keys)) if keys else 0
+        # Per edge, in the order keys add them: parent node and character.
+        # Nodes are numbered in that order too, edge n leads to node n + 1.
+        edge_parent = []
+        edge_chars = []
+        add_parent = edge_parent.append
+        add_char = edge_chars.append
+        # The node each key ends at
+        terminals = []
+        # Nodes along the previous key, which the next one shares a prefix of
+        path = [0]
+        add_path = path.append
+        previous = ''
+        for key in keys:
+            if key.startswith(previous):
+                common = len(previous)
+            else:
+                # Sorted keys differ before the end of the shorter one
+                common = 0
+                while key[common] == previous[common]:
+                    common += 1
+                del path[common + 1:]
+            node = path[-1]
+            for char in key[common:]:
+                add_parent(node)
+                add_char(char)
+                node = len(edge_parent)
+                add_path(node)
+            terminals.append(node)
+            previous = key
+
+        # Place the edges of each node contiguously. Keys are sorted, so the
+        # edges of a node were added in code point order.
+        node_count = len(edge_parent) + 1
+        child_count = [0] * node_count
+        for parent in edge_parent:
+            child_count[parent] += 1
+        first_child = [0] * node_count
+        total = 0
+        for node in range(node_count):
+            first_child[node] = total
+            total += child_count[node]
+        edge_char = [0] * total
+        edge_node = [0] * total
+        slot = first_child[:]
+        for edge, parent in enumerate(edge_parent):
+            k = slot[parent]
+            slot[parent] = k + 1
+            edge_char[k] = ord(edge_chars[edge])
+            edge_node[k] = edge + 1
+
+        values = [map_dict[key] for key in keys]
+        pool = list(dict.fromkeys(values))
+        pool_index = dict(zip(pool, itertools.count()))
+        value_index = array(str('i'), [-1]) * node_count
+        for node, value in zip(terminals, values):
+            value_index[node] = pool_index[value]
+        # multiple mapping, use the first one for now
+        pool = [value.split(' ')[0] for value in pool]
+
+        self.first_child = array(str('I'), first_child)
+        self.child_count = array(str('I'), child_count)
+        self.value_index = value_index
+        self.edge_char = array(str('I'), edge_char)
+        self.edge_node = array(str('I'), edge_node)
+        self.values = tuple(pool)
+        # The root has the most children, look them up by character directly
+        self.root = dict((unichr(edge_char[k]), edge_node[k])
+                         for k in range(child_count[0] if keys else 0))
+
+    def __len__(self):
+        return sum(1 for index in self.value_index if index >= 0)
+
+    def first_chars(self):
+        """
+        :return: the characters keys start with
+        """
+        return frozenset(self.root)
+
+    def prefixes(self, string, start):
+        """
+        Find the keys that string has at offset start.
+        :return: list of (key length, value), shortest first
+        """
+        result = []
+        node = self.root.get(string[start]) if start < len(string) else None
+        if node is None:
+            return result
+        first_child = self.first_child
+        child_count = self.child_count
+        value_index = self.value_index
+        edge_char = self.edge_char
+        pos = start + 1
+        string_len = len(string)
+        while True:
+            if value_index[node] >= 0:
+                result.append((pos - start, self.values[value_index[node]]))
+            if pos == string_len:
+                break
+            lo = first_child[node]
+            hi = lo + child_count[node]
+            code = ord(string[pos])
+            k = bisect_left(edge_char, code, lo, hi)
+            if k == hi or edge_char[k] != code:
+                break
+            node = self.edge_node[k]
+            pos += 1
+        return result
+
+#############################################
+# Tree based reference engine. OpenCC converts through DictGroup; these are
+# kept as the original group semantics tests/test_dict_group.py checks
+# DictGroup output against.
+
 class TreeNode(object):
     LEFT = 0
     RIGHT = 1
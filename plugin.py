@@ -3,8 +3,18 @@ import sys
 import json
 import shutil
 import re
+import time
+import zlib
+import codecs
+import hashlib
+import itertools
 import tkinter as tk
+import threading
 import traceback
+import multiprocessing
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import messagebox, scrolledtext, filedialog
 
 # --- 基礎環境設定 ---
@@ -14,97 +24,814 @@ if plugin_dir not in sys.path:
 
 CONFIG_FILE = os.path.join(plugin_dir, "config.json")
 DICT_DIR = os.path.join(plugin_dir, "dictionary")
+CACHE_DIR = os.path.join(plugin_dir, "convert_cache")
+# 轉換邏輯改變時遞增，讓舊的快取全部失效
+CACHE_VERSION = 2
+# 設定此環境變數為檔案路徑時，記錄轉換各步驟耗時並以 JSON 寫入該檔案
+PROFILE_ENV = "MULTIDICTOPENCC_PROFILE"
 
 if not os.path.exists(DICT_DIR):
     os.makedirs(DICT_DIR)
 
 try:
-    from opencc import OpenCC
+    from opencc import OpenCC, ConversionStats, ocd
 except ImportError:
     print("錯誤：找不到 'opencc'。")
     sys.exit(1)
 
-# --- 核心處理器 (極致優化 Trie 字典樹版) ---
+# --- 核心處理器 ---
+# 不轉換的標記：完整的 style/script 區塊、HTML 標籤與實體字元
+# brk 群組為引號配對不跨越的標記：區塊層級標籤、註解與 script/style 區塊；其他行內標籤與實體字元可跨越
+MARKUP_RE = re.compile(
+    r'<(script|style)[^>]*>.*?</\1>'
+    r'|<(?P<brk>!--|/?(?:script|style|p|div|h[1-6]|li|ul|ol|dl|dt|dd|table|thead|tbody|tr|td|th|blockquote|pre|section|'
+    r'article|aside|header|footer|nav|figure|figcaption|title|head|body|html|hr)\b)[^>]*>'
+    r'|<[^>]+>|&[a-zA-Z#0-9]+;', re.IGNORECASE | re.DOTALL)
+# 串接文字節點用的私用區字元，選用原文中沒有出現的那一個
+TEXT_JOINERS = ('\uE000', '\uF8FF', '\U000FFFFD', '\U0010FFFD')
+# 成對的半形引號換成的全形引號 (開, 關)
+QUOTE_PAIRS = {'"': ('「', '」'), "'": ('『', '』')}
+
+def split_nodes(data):
+    """
+    單次掃描切分標記與文字節點。
+    回傳 (spans, texts, breaks)：spans 依序為 (是否為文字節點, 起點, 終點)，
+    texts 為各文字節點，breaks[i] 標記第 i 個節點前是否有阻斷引號配對的標記
+    """
+    spans = []
+    texts = []
+    breaks = []
+    pending_break = True
+    pos = 0
+    for m in MARKUP_RE.finditer(data):
+        start = m.start()
+        if start > pos:
+            spans.append((True, pos, start))
+            texts.append(data[pos:start])
+            breaks.append(pending_break)
+            pending_break = False
+        pos = m.end()
+        spans.append((False, start, pos))
+        if m.group(1) or m.group('brk'):
+            pending_break = True
+    if pos < len(data):
+        spans.append((True, pos, len(data)))
+        texts.append(data[pos:])
+        breaks.append(pending_break)
+    return spans, texts, breaks
+
 class UltraConverter:
-    def __init__(self, final_dict, mode='s2twp'):
-        self.cc = OpenCC(mode)
-        # 保護完整的 style/script 區塊
-        self.block_re = re.compile(r'<(script|style)[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
-        self.tag_re = re.compile(r'(<[^>]+>|&[a-zA-Z#0-9]+;)')
-        self.place_re = re.compile(r'\uE000(\d+)\uE001')
+    def __init__(self, final_dict, mode='s2twp', stats=None):
+        # 自訂字典交給 OpenCC，在轉換後的全文上比對 (custom_on_output)，與舊版的結果相同
+        # final_dict 也可以是編譯過的 .ocb 檔路徑 (見 custom_dict_source)
+        # stats (ConversionStats) 為選用的效能記錄，與 OpenCC 共用
+        self.stats = stats
+        self.cc = OpenCC(mode, custom_dicts=[final_dict] if final_dict else None, stats=stats,
+                         custom_on_output=True)
         self.char_map = str.maketrans({'“': '「', '”': '」', '‘': '『', '’': '』'})
-        
-        self.trie = {}
-        if final_dict:
-            for key, val in final_dict.items():
-                node = self.trie
-                for char in key:
-                    node = node.setdefault(char, {})
-                node['VALUE'] = val
 
     def process(self, data):
         if not data: return data
-        tag_storage = []
-        
-        def protect(m):
-            tag_storage.append(m.group(0))
-            return f"\uE000{len(tag_storage)-1}\uE001"
-            
-        # 1. 先保護 script 與 style 區塊，避免裡面的 JS/CSS 被轉換
-        protected = self.block_re.sub(protect, data)
-        # 2. 再保護一般 HTML 標籤與實體字元
-        protected = self.tag_re.sub(protect, protected)
+        if self.stats is not None:
+            return self._process_profiled(data)
+        spans, texts, breaks = split_nodes(data)
+        converted = iter(self.convert_texts(texts, breaks, data))
         
-        text = self.cc.convert(protected)
+        # 依原順序組回：標記原樣複製，文字節點換成轉換結果
+        out = []
+        for is_text, start, end in spans:
+            out.append(next(converted) if is_text else data[start:end])
+        return "".join(out)
+
+    def _process_profiled(self, data):
+        """與 process 相同，另記錄切分、轉換與組回各自的耗時"""
+        timer = self.stats.timer
+        start = timer()
+        spans, texts, breaks = split_nodes(data)
+        self.stats.add_time('plugin.tokenize', timer() - start)
+        start = timer()
+        converted = iter(self.convert_texts(texts, breaks, data))
+        self.stats.add_time('plugin.convert', timer() - start)
+        start = timer()
+        out = []
+        for is_text, begin, end in spans:
+            out.append(next(converted) if is_text else data[begin:end])
+        out = "".join(out)
+        self.stats.add_time('plugin.assemble', timer() - start)
+        return out
+
+    def convert_texts(self, texts, breaks, data):
+        """
+        只轉換文字節點；以原文未出現的字元串接後一次轉換與整理引號，再切回各節點。
+        breaks[i] 為真的節點前改用另一個串接字元，引號配對不會跨越它。
+        """
+        unused = [j for j in TEXT_JOINERS if j not in data]
+        if len(unused) >= 2:
+            joiner, breaker = unused[:2]
+            pieces = []
+            for index, text in enumerate(texts):
+                if index:
+                    pieces.append(breaker if breaks[index] else joiner)
+                pieces.append(text)
+            converted = self.finish(self.cc.convert("".join(pieces)), breaker)
+            parts = converted.replace(breaker, joiner).split(joiner)
+            if len(parts) == len(texts):
+                return parts
+        # 沒有可用的串接字元，或字典值中出現了串接字元：改為逐一轉換
+        return [self.finish(self.cc.convert(t)) for t in texts]
+
+    def finish(self, text, breaker=None):
+        """
+        彎引號換成直角引號，並把成對的半形引號換成「」『』。
+        與 re.sub(r'"([^"]+)"') 的配對方式相同，只是配對不跨越 breaker；
+        引號間只有標記 (串接字元) 時，例如 "&hellip;&hellip;"，仍照常配對。
+        """
         text = text.translate(self.char_map)
-        
-        if self.trie:
-            text = self.fast_trie_replace(text)
-            
-        text = re.sub(r'"([^"]+)"', r'「\1」', text)
-        text = re.sub(r"'([^']+)'", r'『\1』', text)
-        
-        return self.place_re.sub(lambda m: tag_storage[int(m.group(1))], text)
-
-    def fast_trie_replace(self, text):
-        res = []
-        i = 0
-        length = len(text)
-        trie = self.trie
-        while i < length:
-            best_match_val = None
-            best_match_len = 0
-            curr_node = trie
-            for j in range(i, length):
-                char = text[j]
-                if char not in curr_node: break
-                curr_node = curr_node[char]
-                if 'VALUE' in curr_node:
-                    best_match_val = curr_node['VALUE']
-                    best_match_len = j - i + 1
-            
-            if best_match_val is not None:
-                res.append(best_match_val)
-                i += best_match_len
+        breaker = re.escape(breaker) if breaker else ''
+        for quote, (open_char, close_char) in QUOTE_PAIRS.items():
+            # 開引號、至少一個字元，直到同一段中的下一個同種引號
+            pattern = '%s([^%s%s]+)%s' % (quote, quote, breaker, quote)
+            text = re.sub(pattern, open_char + r'\1' + close_char, text)
+        return text
+
+# --- 平行處理電子書內容 ---
+# fork 模式下，子行程直接繼承這個處理器，不必每個檔案重新傳送字典
+_worker_processor = None
+
+def _process_in_worker(data):
+    return _worker_processor.process(data)
+
+def _can_fork():
+    """Linux 等支援 fork 的平台；macOS 上 fork 不安全，Windows 不支援"""
+    return 'fork' in multiprocessing.get_all_start_methods() and sys.platform != 'darwin'
+
+def _make_executor(workers):
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+
+def _is_text_entry(fid, mtype):
+    mtype_l = mtype.lower()
+    return any(x in mtype_l for x in ['xhtml', 'xml', 'ncx']) or 'nav' in fid.lower()
+
+def convert_book(bc, processor, workers=None, cache=None):
+    """
+    轉換 bc.manifest_iter() 中的所有文字檔。
+    bc.readfile / bc.writefile 只在主執行緒呼叫 (Sigil 容器並非執行緒安全)，
+    processor.process 在支援 fork 的平台上於行程池中執行，同時處理中的檔案數量有上限；
+    其他平台 (Windows/macOS) 一律在本行程依序轉換 (workers=1)：轉換是純 Python 運算，
+    執行緒池受 GIL 限制不會更快，而以 spawn 啟動的子行程必須各自重新載入字典。
+    單一檔案出錯只會略過該檔並印出 traceback。
+    提供 cache (ConversionCache) 時，內容與字典都沒有影響的檔案直接使用快取結果。
+    """
+    global _worker_processor
+    workers = workers or os.cpu_count() or 1
+    if not _can_fork():
+        workers = 1
+    entries = [e for e in bc.manifest_iter() if _is_text_entry(e[0], e[2])]
+
+    def report(fid, href):
+        print(f"❌ 錯誤：處理檔案 {fid} ({href}) 時發生例外！")
+        traceback.print_exc()
+
+    def read(fid):
+        """讀取檔案並查詢快取，回傳 (原文, 原文雜湊, 快取結果)"""
+        raw = bc.readfile(fid)
+        if not raw or cache is None:
+            return raw, None, None
+        raw_hash, output = cache.lookup(raw)
+        return raw, raw_hash, output
+
+    def write(fid, raw, raw_hash, output, converted=True):
+        if cache is not None and converted:
+            cache.store(raw_hash, raw, output)
+        if output != raw:
+            bc.writefile(fid, output)
+
+    if workers <= 1 or len(entries) <= 1:
+        for entry in entries:
+            fid, href = entry[0], entry[1]
+            try:
+                raw, raw_hash, output = read(fid)
+                if raw and output is not None:
+                    write(fid, raw, raw_hash, output, converted=False)
+                elif raw:
+                    write(fid, raw, raw_hash, processor.process(raw))
+            except Exception:
+                report(fid, href)
+        return
+
+    max_in_flight = workers * 2
+    in_flight = deque()
+
+    def finish_oldest():
+        fid, href, raw, raw_hash, future = in_flight.popleft()
+        try:
+            write(fid, raw, raw_hash, future.result())
+        except Exception:
+            report(fid, href)
+
+    _worker_processor = processor
+    try:
+        with _make_executor(workers) as executor:
+            for entry in entries:
+                fid, href = entry[0], entry[1]
+                try:
+                    raw, raw_hash, output = read(fid)
+                    if raw and output is not None:
+                        # 快取命中：不送進工作池，但仍依序寫回
+                        while in_flight:
+                            finish_oldest()
+                        write(fid, raw, raw_hash, output, converted=False)
+                    elif raw:
+                        in_flight.append((fid, href, raw, raw_hash,
+                                          executor.submit(_process_in_worker, raw)))
+                except Exception:
+                    report(fid, href)
+                # 依序寫回，並限制同時處理中的檔案數量
+                while len(in_flight) >= max_in_flight:
+                    finish_oldest()
+            while in_flight:
+                finish_oldest()
+    finally:
+        _worker_processor = None
+
+# --- 增量轉換快取 ---
+def _hash_text(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class ConversionCache:
+    """
+    存放在 config.json 旁 (convert_cache/) 的轉換結果快取。
+    以檔案內容雜湊為鍵，記錄轉換結果 (zlib 壓縮) 以及當時字典設定的指紋。
+    指紋包含 OpenCC 模式、內建字典檔狀態與自訂字典內容 (含順序造成的覆蓋結果)。
+    只有自訂字典改變時，內容不包含任何變動詞彙的檔案仍沿用快取結果。
+    """
+    def __init__(self, cache_dir, mode, final_dict, max_bytes=256 << 20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.base = self.base_fingerprint(mode)
+        if isinstance(final_dict, str):
+            # 編譯過的大型自訂字典依內容命名，以檔名為指紋，不記錄詞條
+            self.custom = None
+            self.fingerprint = _hash_text(self.base + os.path.basename(final_dict))
+        else:
+            self.custom = dict(final_dict)
+            self.fingerprint = _hash_text(self.base + json.dumps(sorted(self.custom.items()), ensure_ascii=False))
+        self.hits = 0
+        self.misses = 0
+
+        index = self._load_index()
+        # 輸入雜湊 -> {'fp', 'same', 'size', 'used'}；輸出雜湊 -> fp
+        self.inputs = index.get('inputs', {})
+        self.outputs = index.get('outputs', {})
+        self.prev_fingerprint = index.get('fingerprint')
+        self.affected_re = None
+        old_custom = index.get('custom', {})
+        # 沒有記錄詞條的一方無法比對變動的詞彙，所有檔案重新轉換
+        if (self.prev_fingerprint != self.fingerprint and index.get('base') == self.base
+                and self.custom is not None and old_custom is not None):
+            affected = [k for k in set(old_custom) | set(self.custom) if old_custom.get(k) != self.custom.get(k)]
+            # 詞彙是轉換後的形式，在原文中另以反向轉換的形式尋找
+            inverse = INVERSE_MODES.get(mode)
+            if inverse is not None and affected:
+                affected += OpenCC(inverse).convert_keys(affected)
+            self.affected_re = re.compile('|'.join(map(re.escape, affected))) if affected else re.compile(r'(?!)')
+
+    @staticmethod
+    def base_fingerprint(mode):
+        """OpenCC 模式與內建設定/字典檔 (名稱、大小、修改時間) 的指紋"""
+        opencc_dir = os.path.dirname(sys.modules[OpenCC.__module__].__file__)
+        parts = [str(CACHE_VERSION), mode]
+        for sub in ('config', 'dictionary'):
+            folder = os.path.join(opencc_dir, sub)
+            for name in sorted(os.listdir(folder)):
+                st = os.stat(os.path.join(folder, name))
+                parts.append(f"{sub}/{name}:{st.st_size}:{st.st_mtime}")
+        return _hash_text('\n'.join(parts))
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _blob_path(self, raw_hash):
+        return os.path.join(self.cache_dir, raw_hash + '.z')
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except Exception:
+            return {}
+        return index if index.get('version') == CACHE_VERSION else {}
+
+    def _still_valid(self, fp, text):
+        if fp == self.fingerprint:
+            return True
+        # 上次執行後只改了自訂字典，且此檔案不含任何變動的詞彙
+        return (fp == self.prev_fingerprint and self.affected_re is not None
+                and not self.affected_re.search(text))
+
+    def lookup(self, raw):
+        """回傳 (原文雜湊, 可沿用的轉換結果或 None)；命中時更新為目前的指紋"""
+        raw_hash = _hash_text(raw)
+        # 內容本身就是上次轉換的結果
+        fp = self.outputs.get(raw_hash)
+        if fp is not None and self._still_valid(fp, raw):
+            self.outputs[raw_hash] = self.fingerprint
+            self.hits += 1
+            return raw_hash, raw
+        entry = self.inputs.get(raw_hash)
+        if entry is not None and self._still_valid(entry['fp'], raw):
+            output = raw if entry['same'] else self._read_blob(raw_hash)
+            if output is not None:
+                entry['fp'] = self.fingerprint
+                entry['used'] = time.time()
+                self.outputs[_hash_text(output)] = self.fingerprint
+                self.hits += 1
+                return raw_hash, output
+        self.misses += 1
+        return raw_hash, None
+
+    def _read_blob(self, raw_hash):
+        try:
+            with open(self._blob_path(raw_hash), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except Exception:
+            return None
+
+    def store(self, raw_hash, raw, output):
+        """記錄新轉換的結果；內容不變時只記錄索引，不寫快取檔"""
+        same = output == raw
+        size = 0
+        if not same:
+            blob = zlib.compress(output.encode('utf-8'))
+            with open(self._blob_path(raw_hash), 'wb') as f:
+                f.write(blob)
+            size = len(blob)
+        self.inputs[raw_hash] = {'fp': self.fingerprint, 'same': same, 'size': size, 'used': time.time()}
+        self.outputs[_hash_text(output)] = self.fingerprint
+
+    def save(self):
+        """寫回索引，並依最後使用時間淘汰超過容量上限的快取檔"""
+        total = sum(e['size'] for e in self.inputs.values())
+        for raw_hash, entry in sorted(self.inputs.items(), key=lambda item: item[1]['used']):
+            if total <= self.max_bytes and entry['fp'] in (self.fingerprint, self.prev_fingerprint):
+                continue
+            total -= entry['size']
+            del self.inputs[raw_hash]
+            if entry['size']:
+                try:
+                    os.remove(self._blob_path(raw_hash))
+                except OSError:
+                    pass
+        self.outputs = {h: fp for h, fp in self.outputs.items() if fp == self.fingerprint}
+        index = {'version': CACHE_VERSION, 'fingerprint': self.fingerprint, 'base': self.base,
+                 'custom': self.custom, 'inputs': self.inputs, 'outputs': self.outputs}
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp, self._index_path())
+
+# --- 自訂字典 ---
+# 每類重複/衝突詞條最多列出的筆數
+REPORT_LIMIT = 20
+# 字典解析快取，與轉換快取放在同一目錄
+PARSE_CACHE_FILE = os.path.join(CACHE_DIR, "parsed_dicts.json")
+# 最終字典超過此詞條數時編譯為 .ocb，轉換時以 mmap 二分搜尋，不在記憶體中建立字典樹
+LARGE_DICT_ENTRIES = 200000
+# 字典檔超過此大小時，編輯器分頁顯示，每頁 PAGE_LINES 行
+# 也不進入解析快取與反查索引，編譯自訂字典時每次讀取 LARGE_FILE_BATCH_LINES 行
+LARGE_FILE_BYTES = 2 << 20
+PAGE_LINES = 2000
+LARGE_FILE_BATCH_LINES = 20000
+
+# 解析過的字典檔：詞條 [(行號, 原文詞彙, 轉換結果)]、格式錯誤的行 [(行號, 原始內容)] 與各詞條的正規化詞彙
+ParsedDict = namedtuple('ParsedDict', 'name entries errors normalized')
+# 開始轉換前需要準備的一切：各字典解析結果、最終字典 (含大型字典檔時為編譯好的 .ocb 路徑)、反查索引與已載入字典表的 UltraConverter
+PreparedConversion = namedtuple('PreparedConversion', 'sources final_dict index processor')
+
+def parse_dict_text(text, first_line=1):
+    """解析字典檔內容，回傳 (詞條, 格式錯誤的行)；first_line 為 text 第一行的行號"""
+    entries = []
+    errors = []
+    for line_no, line in enumerate(text.splitlines(), first_line):
+        stripped_line = line.strip()
+        if not stripped_line:
+            continue
+        parts = stripped_line.split('\t')
+        values = parts[1].split() if len(parts) >= 2 else None
+        if values:
+            entries.append((line_no, parts[0], values[0]))
+        else:
+            errors.append((line_no, line))
+    return entries, errors
+
+def print_dict_errors(parsed):
+    for line_no, line in parsed.errors:
+        # 防呆驗證：有內容卻沒有 Tab 分隔
+        print(f"⚠️ 警告：字典檔 [{parsed.name}] 第 {line_no} 行格式錯誤，缺少 Tab 分隔符號 -> '{line}'，已略過。")
+
+class DictParseCache:
+    """
+    存放在 convert_cache/ 的字典解析快取，每個字典檔保留最近一次的解析結果。
+    檔案大小與修改時間未變時直接沿用；改變時 (例如存檔後內容相同) 再比對內容雜湊。
+    正規化詞彙依 OpenCC 模式轉換，內建字典改變時整份快取失效。
+    """
+    def __init__(self, path, mode):
+        self.path = path
+        self.base = ConversionCache.base_fingerprint(mode)
+        self.files = {}
+        self.dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION and data.get('base') == self.base:
+                self.files = data['files']
+        except Exception:
+            pass
+
+    def parse(self, f_name, cc, file_path=None, text=None):
+        """
+        解析字典檔 file_path，或尚未存檔的內容 text；cc 為正規化詞彙用的 OpenCC
+        回傳 ParsedDict
+        """
+        cached = self.files.get(f_name)
+        stamp = None
+        if text is None:
+            st = os.stat(file_path)
+            stamp = [st.st_size, st.st_mtime]
+            if cached is not None and cached['stamp'] == stamp:
+                return self._parsed(f_name, cached)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        # 結尾的空白不影響解析結果與行號
+        text_hash = _hash_text(text.rstrip())
+        if cached is not None and cached['hash'] == text_hash:
+            if stamp is not None and cached['stamp'] != stamp:
+                cached['stamp'] = stamp
+                self.dirty = True
+            return self._parsed(f_name, cached)
+        entries, errors = parse_dict_text(text)
+        parsed = ParsedDict(f_name, entries, errors, cc.convert_keys(key for _, key, _ in entries))
+        self.files[f_name] = {'stamp': stamp, 'hash': text_hash, 'entries': entries,
+                              'errors': errors, 'normalized': parsed.normalized}
+        self.dirty = True
+        return parsed
+
+    @staticmethod
+    def _parsed(f_name, cached):
+        return ParsedDict(f_name, [tuple(e) for e in cached['entries']],
+                          [tuple(e) for e in cached['errors']], cached['normalized'])
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'base': self.base, 'files': self.files}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+class KeyIndex:
+    """
+    自訂字典詞彙的反查索引：正規化詞彙 (以 OpenCC 轉換後的形式) -> [(字典檔, 行號, 原文詞彙, 轉換結果)]。
+    詞彙在解析時已批次轉換；建立後查詢重複或衝突的詞條不必重新掃描字典檔。
+    """
+    def __init__(self, cc, sources):
+        """sources 為依字典順序排列的 [ParsedDict]"""
+        self.cc = cc
+        self.entries = {}
+        for parsed in sources:
+            for normalized, (line_no, key, value) in zip(parsed.normalized, parsed.entries):
+                self.entries.setdefault(normalized, []).append((parsed.name, line_no, key, value))
+
+    def sources(self, key):
+        """回傳與 key 正規化後相同的所有詞條"""
+        return self.entries.get(self.cc.convert(key), [])
+
+    def duplicates(self):
+        """正規化後相同且轉換結果也相同的詞條群組"""
+        return {k: v for k, v in self.entries.items() if len(v) > 1 and len({e[3] for e in v}) == 1}
+
+    def conflicts(self):
+        """正規化後相同、但轉換結果不同的詞條群組"""
+        return {k: v for k, v in self.entries.items() if len({e[3] for e in v}) > 1}
+
+    def report(self):
+        """印出衝突與重複的詞條"""
+        for title, groups in (("衝突", self.conflicts()), ("重複", self.duplicates())):
+            for count, (normalized, group) in enumerate(sorted(groups.items())):
+                if count == REPORT_LIMIT:
+                    print(f"   …另有 {len(groups) - REPORT_LIMIT} 組{title}詞條未列出。")
+                    break
+                places = "；".join(f"[{f}] 第 {n} 行 {k} -> {v}" for f, n, k, v in group)
+                print(f"⚠️ {title}詞條 {normalized}：{places}")
+
+def custom_dict_source(final_dict, cache_dir=None):
+    """
+    回傳交給 OpenCC 的自訂字典：一般直接使用 final_dict；
+    超過 LARGE_DICT_ENTRIES 條時改為 cache_dir 中依內容命名的 .ocb 檔 (只保留最新的一份)。
+    final_dict 已是編譯好的 .ocb 路徑時直接使用。
+    """
+    if isinstance(final_dict, str) or len(final_dict) <= LARGE_DICT_ENTRIES:
+        return final_dict
+    digest = _hash_text(json.dumps(sorted(final_dict.items()), ensure_ascii=False))
+    path = _custom_ocb_path(cache_dir, digest)
+    if ocd.is_up_to_date(path, None):
+        return path
+    try:
+        _remove_custom_ocb(cache_dir)
+        ocd.write_dictionary(path, final_dict)
+    except Exception as e:
+        print(f"⚠️ 警告：無法編譯大型自訂字典，改在記憶體中建立：{e}")
+        return final_dict
+    return path
+
+def _custom_ocb_path(cache_dir, digest):
+    return os.path.join(cache_dir or CACHE_DIR, f"custom_{digest}{ocd.EXTENSION}")
+
+def _remove_custom_ocb(cache_dir):
+    """建立 cache_dir 並刪除舊的自訂字典 .ocb 檔"""
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.startswith("custom_") and name.endswith(ocd.EXTENSION):
+            os.remove(os.path.join(cache_dir, name))
+
+def _check_utf8(file_path):
+    """逐段解碼整個檔案而不整份讀入；不是 UTF-8 編碼時丟出 UnicodeDecodeError"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            decoder.decode(block)
+    decoder.decode(b'', final=True)
+
+def compile_custom_dicts(order, base_cc, mode='s2twp', cache_dir=None):
+    """
+    把含有大型字典檔的自訂字典直接串流編譯為 cache_dir 中的 .ocb 檔，回傳其路徑。
+    order 為依字典順序排列的 ParsedDict 或大型字典檔的 (字典檔, 檔案路徑)；大型字典檔不整份讀入記憶體。
+    檔名取自各字典內容與大型字典檔的大小、修改時間，未改變時直接沿用；無法編譯時改為回傳 dict。
+    """
+    parts = [ConversionCache.base_fingerprint(mode)]
+    for item in order:
+        if isinstance(item, ParsedDict):
+            parts.append(json.dumps([item.name, item.entries], ensure_ascii=False))
+        else:
+            st = os.stat(item[1])
+            parts.append(f"{item[0]}:{st.st_size}:{st.st_mtime}")
+    path = _custom_ocb_path(cache_dir, _hash_text('\n'.join(parts)))
+    if ocd.is_up_to_date(path, None):
+        return path
+    readable = []
+    for item in order:
+        if not isinstance(item, ParsedDict):
+            try:
+                _check_utf8(item[1])
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"讀取字典檔 {item[0]} 失敗: {e}")
+                continue
+        readable.append(item)
+    try:
+        _remove_custom_ocb(cache_dir)
+        ocd.write_dictionary_stream(path, _final_entries(readable, base_cc))
+    except Exception as e:
+        print(f"⚠️ 警告：無法編譯大型自訂字典，改在記憶體中建立：{e}")
+        return dict(_final_entries(readable, base_cc))
+    return path
+
+def _final_entries(order, base_cc):
+    """依字典順序產生最終字典的 (詞彙, 轉換結果)；後面的覆蓋前面的，同一詞彙可能出現多次"""
+    for item in order:
+        if isinstance(item, ParsedDict):
+            yield from build_final_dict([item]).items()
+            continue
+        f_name, file_path = item
+        with open(file_path, 'r', encoding='utf-8') as f:
+            first_line = 1
+            while True:
+                text = ''.join(itertools.islice(f, LARGE_FILE_BATCH_LINES))
+                if not text:
+                    break
+                entries, errors = parse_dict_text(text, first_line)
+                first_line += len(text.splitlines())
+                batch = ParsedDict(f_name, entries, errors, base_cc.convert_keys(key for _, key, _ in entries))
+                print_dict_errors(batch)
+                yield from build_final_dict([batch]).items()
+
+# 各轉換的反向轉換，用來把以轉換結果形式書寫的詞彙換回原文形式
+INVERSE_MODES = {'s2t': 't2s', 't2s': 's2t', 's2tw': 'tw2s', 'tw2s': 's2tw', 's2twp': 'tw2sp', 'tw2sp': 's2twp',
+                 's2hk': 'hk2s', 'hk2s': 's2hk', 't2tw': 'tw2t', 'tw2t': 't2tw', 't2hk': 'hk2t', 'hk2t': 't2hk',
+                 't2jp': 'jp2t', 'jp2t': 't2jp'}
+
+def build_final_dict(sources):
+    """
+    合併各字典的詞條為交給 OpenCC 的自訂字典；後面的字典覆蓋前面的。
+    與舊版相同，以正規化詞彙 (轉換後的形式) 比對轉換後的全文 (見 OpenCC 的 custom_on_output)：
+    以繁體或簡體書寫的詞彙都會生效，詞彙前後的文字照常依上下文轉換，含空白或標點的詞彙也能比對。
+    """
+    final_dict = {}
+    for parsed in sources:
+        for normalized, (_, _, value) in zip(parsed.normalized, parsed.entries):
+            final_dict[normalized] = value
+    return final_dict
+
+def prepare_conversion(spec, mode='s2twp', stats=None, parse_cache=None, base_cc=None, cache_dir=None):
+    """
+    解析勾選的字典並建立轉換所需的一切，回傳 PreparedConversion。
+    spec 為依字典順序排列的 [(字典檔, 檔案路徑, 尚未存檔的內容或 None)]；後面的字典覆蓋前面的。
+    cache_dir 為編譯大型自訂字典的目錄，預設為 CACHE_DIR。
+    超過 LARGE_FILE_BYTES 的字典檔不解析也不列入反查索引，直接串流編譯為 .ocb (見 compile_custom_dicts)。
+    """
+    base_cc = base_cc or OpenCC(mode)
+    sources = []
+    # 依字典順序排列的 ParsedDict 與大型字典檔
+    order = []
+    for f_name, file_path, text in spec:
+        try:
+            if text is None and os.path.getsize(file_path) > LARGE_FILE_BYTES:
+                order.append((f_name, file_path))
+                continue
+            if parse_cache is not None:
+                parsed = parse_cache.parse(f_name, base_cc, file_path, text)
             else:
-                res.append(text[i])
-                i += 1
-        return "".join(res)
+                if text is None:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        text = f.read()
+                entries, errors = parse_dict_text(text)
+                parsed = ParsedDict(f_name, entries, errors, base_cc.convert_keys(key for _, key, _ in entries))
+        except (OSError, UnicodeDecodeError) as e:
+            # 例如不是 UTF-8 編碼的字典檔：略過該檔，其他字典照常轉換
+            print(f"讀取字典檔 {f_name} 失敗: {e}")
+            continue
+        sources.append(parsed)
+        order.append(parsed)
+    if len(order) > len(sources):
+        final_dict = compile_custom_dicts(order, base_cc, mode, cache_dir)
+    else:
+        final_dict = build_final_dict(sources)
+    processor = UltraConverter(custom_dict_source(final_dict, cache_dir), mode, stats=stats)
+    # 先建好所有字典表與自訂字典，開始轉換時不必再等
+    processor.cc.load_dictionaries()
+    return PreparedConversion(sources, final_dict, KeyIndex(base_cc, sources), processor)
+
+def spec_stamp(spec):
+    """
+    spec (見 prepare_conversion) 連同以檔案為準的字典檔目前的大小與修改時間，
+    檔案在準備之後被改寫 (例如分頁編輯的字典存檔) 時，與準備當時的結果不再相符
+    """
+    stamped = []
+    for f_name, file_path, text in spec:
+        stamp = None
+        if text is None:
+            try:
+                st = os.stat(file_path)
+                stamp = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        stamped.append((f_name, file_path, text, stamp))
+    return stamped
+
+class Preloader:
+    """
+    在背景執行緒中執行 prepare_conversion，讓使用者挑選字典時就開始解析與載入字典表。
+    submit 可重複呼叫，只處理最新的要求；take 等待與要求相符的結果後結束背景執行緒。
+    結果以 spec_stamp 比對，字典檔在準備後改變時會重新準備。
+    """
+    def __init__(self, mode='s2twp', stats=None, parse_cache=None):
+        self.mode = mode
+        self.stats = stats
+        self.parse_cache = parse_cache
+        self._cond = threading.Condition()
+        self._request = None
+        self._result = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def submit(self, spec):
+        with self._cond:
+            self._request = spec
+            self._cond.notify_all()
+
+    def take(self, spec):
+        """回傳 spec 的 PreparedConversion；背景準備失敗時拋出當時的例外"""
+        self.submit(spec)
+        stamped = spec_stamp(spec)
+        with self._cond:
+            while self._result is None or self._result[0] != stamped:
+                self._cond.wait()
+            self._closed = True
+            self._cond.notify_all()
+        # 之後會以 fork 建立工作行程，先讓背景執行緒結束
+        self._thread.join()
+        prepared = self._result[1]
+        if isinstance(prepared, Exception):
+            raise prepared
+        return prepared
+
+    def _work(self):
+        base_cc = OpenCC(self.mode)
+        while True:
+            with self._cond:
+                while not self._closed and (self._request is None or
+                                            (self._result is not None and
+                                             self._result[0] == spec_stamp(self._request))):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                spec = self._request
+            # 先記下檔案狀態，準備期間檔案若又改變，結果就不會被當成最新的
+            stamped = spec_stamp(spec)
+            try:
+                prepared = prepare_conversion(spec, self.mode, self.stats, self.parse_cache, base_cc)
+            except Exception as e:
+                prepared = e
+            with self._cond:
+                self._result = (stamped, prepared)
+                self._cond.notify_all()
+
+class PagedDictFile:
+    """
+    大型字典檔的分頁檢視：只記錄每頁起點的位元組位置，顯示時才讀出該頁；
+    修改過的頁面暫存在記憶體，存檔時逐頁串流寫回，整個檔案不必載入記憶體。
+    """
+    def __init__(self, path, page_lines=PAGE_LINES):
+        self.path = path
+        self.page_lines = page_lines
+        self.edits = {}  # 頁碼 -> 修改後的內容
+        self._index()
+
+    def _index(self):
+        offsets = array('Q', [0])
+        with open(self.path, 'rb') as f:
+            for count, _ in enumerate(f, 1):
+                if count % self.page_lines == 0:
+                    offsets.append(f.tell())
+            self.size = f.tell()
+        if len(offsets) > 1 and offsets[-1] == self.size:
+            offsets.pop()
+        self.offsets = offsets
+
+    def page_count(self):
+        return len(self.offsets)
+
+    def _read_original(self, page):
+        start = self.offsets[page]
+        stop = self.offsets[page + 1] if page + 1 < len(self.offsets) else self.size
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(stop - start)
+
+    def read_page(self, page):
+        if page in self.edits:
+            return self.edits[page]
+        return self._read_original(page).decode('utf-8')
+
+    def set_page(self, page, text):
+        """記錄頁面內容；與檔案相同 (不計結尾換行) 時視為未修改"""
+        if text.rstrip('\n') == self._read_original(page).decode('utf-8').rstrip('\n'):
+            self.edits.pop(page, None)
+        else:
+            self.edits[page] = text
+
+    def save(self):
+        """逐頁寫入暫存檔後取代原檔，未修改的頁面直接複製原本的位元組"""
+        if not self.edits:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as out:
+            for page in range(len(self.offsets)):
+                if page in self.edits:
+                    text = self.edits[page].rstrip('\n')
+                    if text:
+                        out.write((text + '\n').encode('utf-8'))
+                else:
+                    out.write(self._read_original(page))
+        os.replace(tmp, self.path)
+        self.edits = {}
+        self._index()
 
 # --- GUI 字典管理類別 ---
 class MultiDictManager:
-    def __init__(self, dict_dir):
+    def __init__(self, dict_dir, mode='s2twp', stats=None):
         self.root = tk.Tk()
         self.root.title("MultiDictOpenCC")
         self.root.geometry("850x750")
         self.dict_dir = dict_dir
         self.dict_contents = {}  # 延遲載入：初始為空
+        self.disk_contents = {}  # 載入時的檔案內容，用來判斷是否有未存檔的編輯
+        self.paged = {}  # 大型字典檔 -> PagedDictFile，不放入 dict_contents
+        self.current_page = 0
         self.dict_order = []
         self.dict_enabled = {}
         self.current_file = None
         self.success = False
         self.saved_prefs = self.load_prefs()
+        self.parse_cache = DictParseCache(PARSE_CACHE_FILE, mode)
+        # 使用者挑選字典時，在背景先解析勾選的字典並載入字典表
+        self.preloader = Preloader(mode, stats, self.parse_cache)
+        self._preload_job = None
         self.setup_gui()
+        self.preloader.submit(self.checked_dicts())
 
     def load_prefs(self):
         if os.path.exists(CONFIG_FILE):
@@ -153,6 +880,13 @@ class MultiDictManager:
         self.btn_save_dict = tk.Button(top_ctrl, text="💾 儲存當前字典修改", command=self.manual_save_dict, bg="#ffc107")
         self.btn_save_dict.pack(side="right")
 
+        # 大型字典的換頁控制，只在分頁顯示時出現
+        self.page_nav = tk.Frame(top_ctrl)
+        tk.Button(self.page_nav, text="◀", command=lambda: self.show_page(self.current_page - 1)).pack(side="left")
+        self.lbl_page = tk.Label(self.page_nav)
+        self.lbl_page.pack(side="left", padx=3)
+        tk.Button(self.page_nav, text="▶", command=lambda: self.show_page(self.current_page + 1)).pack(side="left")
+
         self.text_area = scrolledtext.ScrolledText(right, height=40)
         self.text_area.pack(fill="both", expand=True)
 
@@ -180,10 +914,42 @@ class MultiDictManager:
             self.listbox.insert(tk.END, f)
             if f not in self.dict_enabled:
                 self.dict_enabled[f] = tk.BooleanVar(value=self.saved_prefs.get(f, False))
+                self.dict_enabled[f].trace_add('write', lambda *args: self.schedule_preload())
             
             # 延遲載入優化：此處不讀取檔案內容
             tk.Checkbutton(self.scroll_frame, text=f, variable=self.dict_enabled[f]).pack(anchor="w")
 
+    def checked_dicts(self):
+        """依字典順序回傳勾選的 [(字典檔, 檔案路徑, 尚未存檔的內容或 None)]"""
+        spec = []
+        for f in self.dict_order:
+            if self.dict_enabled[f].get():
+                text = self.dict_contents.get(f)
+                if f in self.disk_contents and text.rstrip() == self.disk_contents[f].rstrip():
+                    # 沒有修改過的內容仍以檔案為準，背景準備的結果才能沿用
+                    text = None
+                spec.append((f, os.path.join(self.dict_dir, f), text))
+        return spec
+
+    def schedule_preload(self):
+        """勾選改變後稍待片刻再交給背景執行緒，連續點選只準備最後的組合"""
+        if self._preload_job is not None:
+            self.root.after_cancel(self._preload_job)
+        self._preload_job = self.root.after(300, self._submit_preload)
+
+    def _submit_preload(self):
+        self._preload_job = None
+        self.preloader.submit(self.checked_dicts())
+
+    def take_prepared(self):
+        """回傳目前勾選的字典 (含未存檔的編輯) 的 PreparedConversion，背景已準備好時不必再等"""
+        prepared = self.preloader.take(self.checked_dicts())
+        try:
+            self.parse_cache.save()
+        except Exception as e:
+            print(f"⚠️ 警告：儲存字典解析快取失敗：{e}")
+        return prepared
+
     def _ensure_file_loaded(self, file_name):
         """輔助方法：確保特定字典檔的內容已被載入記憶體"""
         if file_name not in self.dict_contents:
@@ -191,6 +957,7 @@ class MultiDictManager:
             try:
                 with open(file_path, 'r', encoding='utf-8') as obj:
                     self.dict_contents[file_name] = obj.read()
+                self.disk_contents[file_name] = self.dict_contents[file_name]
             except Exception as e:
                 print(f"讀取字典檔 {file_name} 失敗: {e}")
                 self.dict_contents[file_name] = ""
@@ -201,6 +968,15 @@ class MultiDictManager:
         if sel:
             self.current_file = self.listbox.get(sel[0])
             self.lbl_editing.config(text=f"正在編輯: {self.current_file}")
+
+            if self.current_file in self.paged or self._is_large(self.current_file):
+                # 大型字典分頁顯示，不整份載入
+                if self.current_file not in self.paged:
+                    self.paged[self.current_file] = PagedDictFile(os.path.join(self.dict_dir, self.current_file))
+                self.page_nav.pack(side="right", padx=5)
+                self._display_page(0)
+                return
+            self.page_nav.pack_forget()
             
             # 點擊時才真正載入檔案內容
             self._ensure_file_loaded(self.current_file)
@@ -208,9 +984,33 @@ class MultiDictManager:
             self.text_area.delete("1.0", tk.END)
             self.text_area.insert(tk.END, self.dict_contents[self.current_file])
 
+    def _is_large(self, file_name):
+        try:
+            return os.path.getsize(os.path.join(self.dict_dir, file_name)) > LARGE_FILE_BYTES
+        except OSError:
+            return False
+
+    def show_page(self, page):
+        """暫存目前頁面的修改後換頁"""
+        paged = self.paged.get(self.current_file)
+        if paged is None or not 0 <= page < paged.page_count():
+            return
+        self.auto_save_current_edit()
+        self._display_page(page)
+
+    def _display_page(self, page):
+        paged = self.paged[self.current_file]
+        self.current_page = page
+        self.text_area.delete("1.0", tk.END)
+        self.text_area.insert(tk.END, paged.read_page(page))
+        first = page * paged.page_lines + 1
+        self.lbl_page.config(text=f"第 {page + 1}/{paged.page_count()} 頁 (約第 {first} 行起)")
+
     def auto_save_current_edit(self):
         """僅更新記憶體中的內容快取"""
-        if self.current_file: 
+        if self.current_file in self.paged:
+            self.paged[self.current_file].set_page(self.current_page, self.text_area.get("1.0", tk.END))
+        elif self.current_file: 
             self.dict_contents[self.current_file] = self.text_area.get("1.0", tk.END)
 
     def manual_save_dict(self):
@@ -219,6 +1019,18 @@ class MultiDictManager:
             messagebox.showinfo("提示", "請先選擇一個字典檔進行修改。")
             return
         
+        paged = self.paged.get(self.current_file)
+        if paged is not None:
+            self.auto_save_current_edit()
+            try:
+                paged.save()
+                # 存檔後頁面位置重新計算
+                self._display_page(min(self.current_page, paged.page_count() - 1))
+                messagebox.showinfo("成功", f"字典檔 【{self.current_file}】 已成功儲存！")
+            except Exception as e:
+                messagebox.showerror("錯誤", f"儲存檔案失敗：{e}")
+            return
+
         # 讀取當前畫面輸入
         current_text = self.text_area.get("1.0", tk.END).strip()
         self.dict_contents[self.current_file] = current_text
@@ -274,6 +1086,11 @@ class MultiDictManager:
                     obj.write(c.strip())
             except Exception as e:
                 print(f"自動存檔 {f} 失敗: {e}")
+        for f, paged in self.paged.items():
+            try:
+                paged.save()
+            except Exception as e:
+                print(f"自動存檔 {f} 失敗: {e}")
                 
         self.success = True
         self.root.destroy()
@@ -283,50 +1100,46 @@ class MultiDictManager:
         return self.success
 
 # --- Sigil 進入點 ---
-def run(bc):
-    gui = MultiDictManager(DICT_DIR)
+def run(bc, cache_dir=None):
+    """Sigil 進入點；cache_dir 為轉換快取目錄，預設為 CACHE_DIR (效能測試以空目錄量測完整轉換)"""
+    cache_dir = cache_dir or CACHE_DIR
+    profile_path = os.environ.get(PROFILE_ENV)
+    stats = ConversionStats() if profile_path else None
+    gui = MultiDictManager(DICT_DIR, 's2twp', stats=stats)
     if not gui.show(): 
         return 0
     
     print("MultiDictOpenCC: 開始處理電子書...")
-    cc_main = OpenCC('s2twp')
-    final_dict = {}
-    
-    # 建立最終字典
-    for f_name in gui.dict_order:
-        if gui.dict_enabled[f_name].get():
-            # 若使用者執行前未點擊過該檔案，需在此處載入
-            gui._ensure_file_loaded(f_name)
-            
-            line_count = 0
-            for line in gui.dict_contents[f_name].splitlines():
-                line_count += 1
-                stripped_line = line.strip()
-                if not stripped_line:
-                    continue
-                    
-                parts = stripped_line.split('\t')
-                if len(parts) >= 2:
-                    k = cc_main.convert(parts[0])
-                    final_dict[k] = parts[1].split()[0]
-                else:
-                    # 防呆驗證：有內容卻沒有 Tab 分隔
-                    print(f"⚠️ 警告：字典檔 [{f_name}] 第 {line_count} 行格式錯誤，缺少 Tab 分隔符號 -> '{line}'，已略過。")
-    
-    processor = UltraConverter(final_dict, 's2twp')
+    # 建立最終字典 (背景執行緒通常已準備好)
+    prepared = gui.take_prepared()
+    for parsed in prepared.sources:
+        print_dict_errors(parsed)
+    # 回報多個字典 (或同一字典) 中正規化後相同的詞條
+    prepared.index.report()
+    final_dict = prepared.final_dict
+    processor = prepared.processor
+    cache = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache = ConversionCache(cache_dir, 's2twp', final_dict)
+    except Exception as e:
+        print(f"⚠️ 警告：無法使用轉換快取，將轉換所有檔案：{e}")
 
-    # 處理電子書內容
-    for entry in bc.manifest_iter():
-        fid, href, mtype = entry[0], entry[1], entry[2]
-        mtype_l = mtype.lower()
-        if any(x in mtype_l for x in ['xhtml', 'xml', 'ncx']) or 'nav' in fid.lower():
-            try:
-                raw = bc.readfile(fid)
-                if raw:
-                    bc.writefile(fid, processor.process(raw))
-            except Exception as e:
-                print(f"❌ 錯誤：處理檔案 {fid} ({href}) 時發生例外！")
-                traceback.print_exc()
+    # 處理電子書內容；記錄效能時在本行程內轉換，統計才不會留在子行程中
+    convert_book(bc, processor, workers=1 if stats is not None else None, cache=cache)
+    if stats is not None:
+        try:
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                f.write(stats.to_json(indent=1))
+            print(f"MultiDictOpenCC: 效能記錄已寫入 {profile_path}")
+        except Exception as e:
+            print(f"⚠️ 警告：無法寫入效能記錄：{e}")
+    if cache is not None:
+        print(f"MultiDictOpenCC: 快取沿用 {cache.hits} 個檔案，重新轉換 {cache.misses} 個檔案。")
+        try:
+            cache.save()
+        except Exception as e:
+            print(f"⚠️ 警告：儲存轉換快取失敗：{e}")
 
     print("MultiDictOpenCC: 處理完成！")
     return 0
\ No newline at end of file
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+##########################################################
+# AsyncOpenCC converting in a process pool
+#
+# Workers build their own OpenCC and must give the same output as the
+# converter they stand for, custom dictionaries and options included.
+##########################################################
+
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from opencc import OpenCC
+from opencc.aio import AsyncOpenCC
+
+
+class ProcessPoolTest(unittest.TestCase):
+
+    def test_workers_keep_the_converter_settings(self):
+        temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp)
+        path = os.path.join(temp, 'custom.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('头发\t秀髮\n')
+        cc = OpenCC('s2t', custom_dicts=[path], select_candidates=True, fuse_chain=False)
+        texts = ['干燥的头发', '净末丑', '头发' * 20]
+
+        async def convert():
+            with ProcessPoolExecutor(1) as executor:
+                acc = AsyncOpenCC(converter=cc, executor=executor, chunk_size=8)
+                return await acc.convert_many(texts)
+
+        self.assertEqual(asyncio.run(convert()), [cc.convert(text) for text in texts])
+
+    def test_custom_dicts_in_memory_are_refused(self):
+        cc = OpenCC('s2t', custom_dicts=[{'头发': '秀髮'}])
+        with ProcessPoolExecutor(1) as executor:
+            self.assertRaises(ValueError, AsyncOpenCC, converter=cc, executor=executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
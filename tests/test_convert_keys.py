@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# OpenCC.convert_keys against converting every key on its own
+##########################################################
+
+import random
+import unittest
+from unittest import mock
+
+from opencc import OpenCC
+from test_dict_group import CONFIGS
+
+
+def sample_keys(cc, rng, keys_per_dict=50):
+    """
+    Keys of every dictionary of the chain of cc, with empty keys, keys
+    holding separators and keys no dictionary has among them
+    """
+    keys = ['', ' ', '，', 'abc', '头 发', '〇']
+    for stage in cc._dict_chain_data:
+        for path in stage.paths:
+            entries = sorted(cc.registry.get_dict(path)[2])
+            keys.extend(rng.sample(entries, min(keys_per_dict, len(entries))))
+    rng.shuffle(keys)
+    return keys
+
+
+class ConvertKeysTest(unittest.TestCase):
+
+    def test_bundled_configs(self):
+        for config in CONFIGS:
+            cc = OpenCC(config)
+            keys = sample_keys(cc, random.Random(config))
+            self.assertEqual(cc.convert_keys(keys), [cc.convert(key) for key in keys], config)
+            # Any iterable
+            self.assertEqual(cc.convert_keys(iter(keys)), cc.convert_keys(keys), config)
+        self.assertEqual(OpenCC('s2t').convert_keys([]), [])
+
+    def test_one_pass(self):
+        cc = OpenCC('s2twp')
+        keys = sample_keys(cc, random.Random(1))
+        expected = [cc.convert(key) for key in keys]
+        with mock.patch.object(cc, 'convert', wraps=cc.convert) as convert:
+            self.assertEqual(cc.convert_keys(keys), expected)
+        self.assertEqual(convert.call_count, 1)
+
+    def test_newlines(self):
+        # Keys or values holding the newline the keys are joined with
+        cc = OpenCC('s2t')
+        keys = ['头发', '打印\n机', '', '软件']
+        self.assertEqual(cc.convert_keys(keys), ['頭髮', '打印\n機', '', '軟件'])
+        cc.set_custom_dicts([{'软件': '軟\n體'}])
+        self.assertEqual(cc.convert_keys(keys), ['頭髮', '打印\n機', '', '軟\n體'])
+
+    def test_custom_dicts(self):
+        cc = OpenCC('s2twp', custom_dicts=[{'头发': '秀髮', 'Harry Potter': '哈利波特'}])
+        keys = ['头发', 'Harry Potter', 'Harry', 'Potter', '头发干燥', 'Harry Potter！']
+        self.assertEqual(cc.convert_keys(keys), [cc.convert(key) for key in keys])
+        self.assertEqual(cc.convert_keys(keys)[:3], ['秀髮', '哈利波特', 'Harry'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# Custom dictionary keys holding separators
+#
+# Names such as "Harry Potter" hold separators the text is split at, so
+# they are matched over the whole text instead of within a segment, from
+# a dict, a txt or a compiled dictionary, and in streamed text.
+##########################################################
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from opencc import OpenCC, ocd
+
+NAMES = {'Harry Potter': '哈利波特', 'A.I.': '人工智慧', '曼苏尔．达杜拉': '曼蘇爾·達杜拉',
+         'Harry': '哈利', '头发': '秀髮'}
+TEXT = 'Harry Potter说A.I.和曼苏尔．达杜拉的头发，Harry。'
+EXPECTED = '哈利波特說人工智慧和曼蘇爾·達杜拉的秀髮，哈利。'
+
+
+class SeparatorKeysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp)
+
+    def custom_dicts(self):
+        txt = os.path.join(self.temp, 'names.txt')
+        with io.open(txt, 'w', encoding='utf-8') as f:
+            f.write(''.join('%s\t%s\n' % item for item in sorted(NAMES.items())))
+        compiled = os.path.join(self.temp, 'names' + ocd.EXTENSION)
+        ocd.write_dictionary(compiled, NAMES)
+        return [NAMES, txt, compiled]
+
+    def test_keys_holding_separators(self):
+        for custom in self.custom_dicts():
+            cc = OpenCC('s2t', custom_dicts=[custom])
+            self.assertEqual(cc.convert(TEXT), EXPECTED, custom)
+            chunks = [TEXT[i:i + 3] for i in range(0, len(TEXT), 3)]
+            self.assertEqual("".join(cc.iter_convert(chunks, max_buffer=4)), EXPECTED, custom)
+
+    def test_keys_holding_separators_on_output(self):
+        converted = dict((OpenCC('s2t').convert(key), value) for key, value in NAMES.items())
+        cc = OpenCC('s2t', custom_dicts=[converted], custom_on_output=True)
+        self.assertEqual(cc.convert(TEXT), EXPECTED)
+        chunks = [TEXT[i:i + 3] for i in range(0, len(TEXT), 3)]
+        self.assertEqual("".join(cc.iter_convert(chunks, max_buffer=4)), EXPECTED)
+
+    def test_search_keys(self):
+        compiled = self.custom_dicts()[2]
+        found = ocd.BinaryDict(compiled).search_keys(' ．.')
+        self.assertEqual(found, dict((key, NAMES[key]) for key in ('Harry Potter', 'A.I.', '曼苏尔．达杜拉')))
+
+
+class CustomFileTest(unittest.TestCase):
+
+    def test_blank_and_malformed_lines(self):
+        temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp)
+        path = os.path.join(temp, 'user.txt')
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write('头发\t秀髮\n\n  \n没有分隔\n电脑\t\n软件\t軟體 软体\n')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            cc = OpenCC('s2t', custom_dicts=[path])
+            self.assertEqual(cc.convert('头发和软件'), '秀髮和軟體')
+        self.assertEqual(len(caught), 1)
+        self.assertIn('line 4, 5', str(caught[0].message))
+
+
+if __name__ == '__main__':
+    unittest.main()
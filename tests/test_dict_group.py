@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# DictGroup against the tree based reference engine
+#
+# DictGroup replaced StringTree as the conversion engine and must give the
+# same output: within a group earlier dictionaries win, then longer keys,
+# then the leftmost occurrence, a character is matched once per group and
+# entries with several candidates convert to the first one.
+##########################################################
+
+import copy
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from opencc import OpenCC, ocd, opencc
+from opencc.opencc import CONFIG_DIR, CompactTrie, DictGroup, StringTree
+
+CONFIGS = sorted(name[:-5] for name in os.listdir(
+    os.path.join(os.path.dirname(opencc.__file__), CONFIG_DIR)) if name.endswith('.json'))
+
+
+def tree_convert(string, chain):
+    """
+    Convert a segment the way OpenCC did before DictGroup
+    :param chain: list of groups, each a list of parsed dictionaries
+    """
+    for test_dict_list in chain:
+        tree = StringTree(string)
+        tree.create_parse_tree(test_dict_list)
+        string = "".join(tree.inorder())
+    return string
+
+
+def tree_convert_text(cc, text):
+    """
+    Convert text with the chain of cc through the reference engine
+    """
+    chain = [[cc.registry.get_dict(path) for path in stage.paths]
+             for stage in cc._dict_chain_data]
+    segments = cc.split_chars_re.split(text)
+    return "".join(segment if i % 2 else tree_convert(segment, chain)
+                   for i, segment in enumerate(segments))
+
+
+def parsed(map_dict):
+    """
+    :return: map_dict as load_dictionary returns it
+    """
+    lengths = [len(key) for key in map_dict]
+    return max(lengths + [1]), min(lengths + [1000]), map_dict
+
+
+def custom_convert(string, dicts):
+    """
+    Convert a segment with custom dictionaries the plain way: at every
+    offset the longest key of any of dicts, the earliest dict on a tie
+    """
+    max_len = max([len(key) for map_dict in dicts for key in map_dict] + [1])
+    result = []
+    i = 0
+    while i < len(string):
+        for length in range(min(max_len, len(string) - i), 0, -1):
+            key = string[i:i + length]
+            values = [map_dict[key] for map_dict in dicts if key in map_dict]
+            if values:
+                result.append(values[0].split(' ')[0])
+                i += length
+                break
+        else:
+            result.append(string[i])
+            i += 1
+    return "".join(result)
+
+
+def without_char_map(group):
+    """
+    :return: a copy of group matching the keys of its char_map through the
+             table instead, after every other key
+    """
+    plain = copy.copy(group)
+    plain.table = dict(group.table)
+    plain.priorities = dict(group.priorities)
+    last = max(list(group.priorities.values()) + [0]) + 1
+    for char, value in group.char_map.items():
+        plain.table[chr(char)] = value
+        plain.priorities[chr(char)] = last
+    plain.char_map = {}
+    return plain
+
+
+def mixed_corpus(cc, rng, keys_per_dict=300):
+    """
+    Text made of keys of every dictionary of the chain of cc, run together
+    so matches compete across key boundaries, with separators, ASCII and
+    characters no dictionary has in between
+    """
+    pieces = []
+    for stage in cc._dict_chain_data:
+        for path in stage.paths:
+            keys = sorted(cc.registry.get_dict(path)[2])
+            pieces.extend(rng.sample(keys, min(keys_per_dict, len(keys))))
+    rng.shuffle(pieces)
+    fillers = ['', '', '', ' ', '，', '。', '\n', 'abc', '123', '的', '〇', '𠀀']
+    return "".join(piece + rng.choice(fillers) for piece in pieces)
+
+
+class DictGroupTest(unittest.TestCase):
+
+    def test_random_groups(self):
+        rng = random.Random(1)
+        alphabet = 'abcdef'
+        for _ in range(300):
+            dicts = []
+            for _ in range(rng.randint(1, 3)):
+                map_dict = {}
+                for _ in range(rng.randint(1, 12)):
+                    key = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                    map_dict[key] = ' '.join(rng.choice('XYZxyz') * rng.randint(1, 3)
+                                             for _ in range(rng.randint(1, 2)))
+                dicts.append(parsed(map_dict))
+            group = DictGroup(dicts)
+            for _ in range(20):
+                string = ''.join(rng.choice(alphabet + 'g') for _ in range(rng.randint(0, 12)))
+                self.assertEqual(group.convert(string), tree_convert(string, [dicts]),
+                                 (string, dicts))
+
+    def test_compact_trie(self):
+        rng = random.Random(2)
+        for alphabet in ('abcdef', 'ab\U00020000c'):
+            for _ in range(200):
+                map_dict = {}
+                for _ in range(rng.randint(0, 20)):
+                    key = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+                    map_dict[key] = rng.choice(['X', 'Y Z', 'W'])
+                trie = CompactTrie(map_dict)
+                self.assertEqual(len(trie), len(map_dict))
+                string = ''.join(rng.choice(alphabet + 'g') for _ in range(10))
+                for i in range(len(string)):
+                    expected = [(end - i, map_dict[string[i:end]].split(' ')[0])
+                                for end in range(i + 1, len(string) + 1)
+                                if string[i:end] in map_dict]
+                    self.assertEqual(trie.prefixes(string, i), expected, (map_dict, string, i))
+
+    def test_char_map(self):
+        # Single character keys applied with str.translate give what
+        # matching them as keys gives
+        for config in CONFIGS:
+            for fuse_chain in (False, True):
+                cc = OpenCC(config, fuse_chain=fuse_chain)
+                cc.convert('')
+                segments = cc.split_chars_re.split(mixed_corpus(cc, random.Random(config)))[::2]
+                for stage in cc._dict_chain_data:
+                    group = stage.load()
+                    plain = without_char_map(group)
+                    self.assertTrue(group.char_map, (config, stage.name))
+                    for segment in segments:
+                        self.assertEqual(group.convert(segment), plain.convert(segment),
+                                         (config, fuse_chain, segment))
+
+    def test_custom_tries(self):
+        # Custom dictionaries matched through CompactTrie, alone or next to
+        # compiled ones, against leftmost-longest over the dicts themselves
+        temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp)
+        rng = random.Random(3)
+        alphabet = 'ab\U00020000c'
+        for index in range(100):
+            dicts = []
+            for _ in range(rng.randint(1, 3)):
+                map_dict = {}
+                for _ in range(rng.randint(0, 15)):
+                    key = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+                    map_dict[key] = rng.choice(['X', 'Y Z', 'W'])
+                dicts.append(map_dict)
+            tries = [CompactTrie(map_dict) for map_dict in dicts]
+            for trie, map_dict in zip(tries, dicts):
+                self.assertEqual(trie.first_chars(), frozenset(key[0] for key in map_dict))
+            path = os.path.join(temp, '%d%s' % (index, ocd.EXTENSION))
+            ocd.write_dictionary(path, dicts[-1])
+            groups = [DictGroup([], custom=tries),
+                      DictGroup([], custom=tries[:-1] + [ocd.load(path)[2]])]
+            for _ in range(20):
+                string = ''.join(rng.choice(alphabet + 'g') for _ in range(rng.randint(0, 12)))
+                expected = custom_convert(string, dicts)
+                for group in groups:
+                    self.assertEqual(group.convert(string), expected, (string, dicts))
+
+    def test_bundled_configs(self):
+        for config in CONFIGS:
+            cc = OpenCC(config, fuse_chain=False)
+            text = mixed_corpus(cc, random.Random(config))
+            self.assertEqual(cc.convert(text), tree_convert_text(cc, text), config)
+
+    def test_compiled_dictionaries(self):
+        # Compiled dictionaries are searched in place instead of being
+        # decoded into the table, alone or next to parsed ones
+        temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp)
+
+        def compiled(path):
+            target = os.path.join(temp, os.path.basename(path)[:-4] + ocd.EXTENSION)
+            if not os.path.exists(target):
+                ocd.compile_dictionary(path, target)
+            return ocd.load(target)
+
+        for config in CONFIGS:
+            cc = OpenCC(config)
+            cc.convert('')
+            segments = cc.split_chars_re.split(mixed_corpus(cc, random.Random(config)))[::2]
+            for stage in cc._dict_chain_data:
+                tails = [[cc.registry.get_dict(path) for path in tail] for tail in stage.tails]
+                group = DictGroup([cc.registry.get_dict(path) for path in stage.paths], tails=tails)
+                binary = DictGroup([compiled(path) for path in stage.paths], tails=tails)
+                mixed = DictGroup([compiled(path) if i % 2 else cc.registry.get_dict(path)
+                                   for i, path in enumerate(stage.paths)], tails=tails)
+                self.assertFalse(binary.table)
+                for segment in segments:
+                    expected = group.convert(segment)
+                    self.assertEqual(binary.convert(segment), expected, (config, segment))
+                    self.assertEqual(mixed.convert(segment), expected, (config, segment))
+
+
+if __name__ == '__main__':
+    unittest.main()
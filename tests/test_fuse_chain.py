@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# Fused conversion chains against staged execution
+#
+# Folding single character stages into the stage before them must give the
+# same output as running every stage in turn, for every bundled config,
+# with and without custom dictionaries.
+##########################################################
+
+import random
+import unittest
+
+from opencc import OpenCC
+from opencc.opencc import DictRegistry
+from test_dict_group import CONFIGS, mixed_corpus
+
+
+def custom_dict(cc, rng, size=50):
+    """
+    Custom entries made of keys of the first stage and of the stages after
+    it, some extended past the end of a key, with values that later stages
+    would convert if they were not final
+    """
+    keys = []
+    for stage in cc._dict_chain_data:
+        for path in stage.paths:
+            entries = sorted(cc.registry.get_dict(path)[2])
+            keys.extend(rng.sample(entries, min(10, len(entries))))
+    custom = {}
+    for key in rng.sample(keys, min(size, len(keys))):
+        if rng.random() < 0.3:
+            key += rng.choice(keys)
+        custom[key] = rng.choice(keys)
+    return custom
+
+
+class FuseChainTest(unittest.TestCase):
+
+    def assert_fused(self, config, custom_dicts=None):
+        rng = random.Random(config)
+        staged = OpenCC(config, fuse_chain=False, custom_dicts=custom_dicts)
+        fused = OpenCC(config, custom_dicts=custom_dicts)
+        text = mixed_corpus(staged, rng)
+        fused.convert('')
+        self.assertEqual(fused.convert(text), staged.convert(text), config)
+        return fused
+
+    def test_bundled_configs(self):
+        fused_any = False
+        for config in CONFIGS:
+            fused = self.assert_fused(config)
+            fused_any = fused_any or any(stage.tails for stage in fused._dict_chain_data)
+        # The check means nothing if no config has a stage to fuse
+        self.assertTrue(fused_any)
+
+    def test_bundled_configs_with_custom_dicts(self):
+        for config in CONFIGS:
+            cc = OpenCC(config, fuse_chain=False)
+            self.assert_fused(config, [custom_dict(cc, random.Random(config))])
+
+    def test_fusing_loads_no_dictionary(self):
+        # Which stages fold is decided without parsing them, so text no
+        # stage matches still loads nothing
+        registry = DictRegistry()
+        cc = OpenCC('s2twp', registry=registry)
+        self.assertEqual(cc.convert('한국어 텍스트'), '한국어 텍스트')
+        self.assertTrue(any(stage.tails for stage in cc._dict_chain_data))
+        self.assertEqual([key for key in registry._entries if key[0] != 'chars'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
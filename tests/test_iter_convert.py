@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# Streamed conversion against converting the whole text
+#
+# iter_convert has to cut text with no separator once it holds more than
+# max_buffer characters, and must not cut through a key when it does.
+##########################################################
+
+import random
+import unittest
+
+from opencc import OpenCC
+from test_dict_group import CONFIGS, mixed_corpus
+from test_fuse_chain import custom_dict
+
+
+def iter_convert(cc, text, size=5, max_buffer=20):
+    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+    return "".join(cc.iter_convert(chunks, max_buffer=max_buffer))
+
+
+class IterConvertTest(unittest.TestCase):
+
+    def assert_streamed(self, cc, config):
+        text = cc.split_chars_re.sub('', mixed_corpus(cc, random.Random(config)))
+        # Without the ASCII and the characters no dictionary has, every cut
+        # has to be checked against the keys
+        han = "".join(char for char in text if '㐀' <= char <= '鿿')
+        for string in (text, han):
+            self.assertEqual(iter_convert(cc, string), cc.convert(string), config)
+
+    def test_bundled_configs(self):
+        for config in CONFIGS:
+            self.assert_streamed(OpenCC(config), config)
+            self.assert_streamed(OpenCC(config, select_candidates=True), config)
+
+    def test_bundled_configs_with_custom_dicts(self):
+        for config in CONFIGS:
+            custom = custom_dict(OpenCC(config, fuse_chain=False), random.Random(config))
+            self.assert_streamed(OpenCC(config, custom_dicts=[custom]), config)
+
+    def test_separators(self):
+        cc = OpenCC('s2t')
+        text = '头发，' * 10 + '干燥的头发'
+        self.assertEqual(iter_convert(cc, text, size=3, max_buffer=4), cc.convert(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
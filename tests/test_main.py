@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# python -m opencc with several inputs
+##########################################################
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+from opencc import __main__ as cli
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp)
+        self.output = os.path.join(self.temp, 'out')
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.temp, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_cli(self, *inputs):
+        argv = ['opencc', '-c', 's2t', '-j', '1', '-o', self.output, '-i'] + list(inputs)
+        with mock.patch.object(sys, 'argv', argv), redirect_stderr(io.StringIO()) as err:
+            return cli.main(), err.getvalue()
+
+    def read(self, rel_path):
+        with io.open(os.path.join(self.output, rel_path), encoding='utf-8') as f:
+            return f.read()
+
+    def test_files_and_directories(self):
+        first = self.write('a/x.txt', '头发')
+        self.write('d/sub/y.txt', '打印机')
+        self.assertEqual(self.run_cli(first, os.path.join(self.temp, 'd')), (0, ''))
+        self.assertEqual(self.read('x.txt'), '頭髮')
+        self.assertEqual(self.read('sub/y.txt'), '打印機')
+
+    def test_duplicate_outputs(self):
+        first = self.write('a/x.txt', '头发')
+        second = self.write('b/x.txt', '打印机')
+        self.write('d1/sub/y.txt', '软件')
+        self.write('d2/sub/y.txt', '鼠标')
+        for inputs, rel_path in (([first, second], 'x.txt'),
+                                 (['d1', 'd2'], os.path.join('sub', 'y.txt'))):
+            inputs = [os.path.join(self.temp, path) for path in inputs]
+            code, err = self.run_cli(*inputs)
+            self.assertEqual(code, 1)
+            self.assertIn(os.path.join(self.output, rel_path), err)
+            self.assertFalse(os.path.exists(self.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
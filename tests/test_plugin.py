@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+##########################################################
+# UltraConverter of the Sigil plugin
+##########################################################
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import plugin
+from opencc import ocd
+
+
+class QuoteTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.processor = plugin.UltraConverter({})
+
+    def test_quotes_around_entities(self):
+        # Ellipsis only dialogue: the entities are markup, not text
+        self.assertEqual(self.processor.process('<p>"&hellip;&hellip;"他说。"好的。"</p>'),
+                         '<p>「&hellip;&hellip;」他說。「好的。」</p>')
+        self.assertEqual(self.processor.process("<p>'&mdash;'</p>"), '<p>『&mdash;』</p>')
+
+    def test_quotes_across_inline_markup(self):
+        self.assertEqual(self.processor.process('<p>"<b>粗</b>体" and \'单\'</p>'),
+                         '<p>「<b>粗</b>體」 and 『單』</p>')
+
+    def test_quotes_do_not_cross_blocks(self):
+        self.assertEqual(self.processor.process('<p>"开</p><p>始"</p>'), '<p>"開</p><p>始"</p>')
+
+    def test_empty_quotes_are_not_paired(self):
+        self.assertEqual(self.processor.process('<p>""x"</p>'), '<p>"「x」</p>')
+
+
+def final_dict(*lines):
+    """The final custom dictionary made of lines"""
+    base_cc = plugin.OpenCC('s2twp')
+    entries, errors = plugin.parse_dict_text('\n'.join(lines))
+    parsed = plugin.ParsedDict('custom.txt', entries, errors,
+                               base_cc.convert_keys(key for _, key, _ in entries))
+    return plugin.build_final_dict([parsed])
+
+
+def converter(*lines):
+    """UltraConverter of a custom dictionary made of lines"""
+    return plugin.UltraConverter(final_dict(*lines))
+
+
+class CustomDictTest(unittest.TestCase):
+
+    def test_context_around_custom_keys(self):
+        # Custom keys match the converted text, as the replacement pass they
+        # replaced did: the text around them still converts in context
+        self.assertEqual(converter('發\t发').process('<p>头发</p>'), '<p>頭髮</p>')
+        self.assertEqual(converter('的头\tY').process('<p>我的头发</p>'), '<p>我Y髮</p>')
+
+    def test_either_script(self):
+        self.assertEqual(converter('电脑\t計算機').process('<p>电脑和電腦</p>'), '<p>計算機和計算機</p>')
+
+    def test_keys_holding_separators(self):
+        processor = converter('Harry Potter\t哈利波特', 'A.I.\t人工智慧', '曼苏尔．达杜拉\t曼蘇爾·達杜拉')
+        self.assertEqual(processor.process('<p>Harry Potter、A.I.和曼苏尔．达杜拉</p>'),
+                         '<p>哈利波特、人工智慧和曼蘇爾·達杜拉</p>')
+
+
+class FakeContainer(object):
+    """
+    The parts of the Sigil BookContainer used by plugin.run
+    """
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.order = [fid for fid, _ in files]
+        self.written = {}
+
+    def manifest_iter(self):
+        for fid in self.order:
+            yield fid, 'Text/%s.xhtml' % fid, 'application/xhtml+xml'
+        yield 'cover', 'Images/cover.jpg', 'image/jpeg'
+
+    def readfile(self, fid):
+        return self.files[fid]
+
+    def writefile(self, fid, data):
+        self.written[fid] = data
+
+
+def make_files(count):
+    return [('c%02d' % index, '<p>"第%d章" 头发干燥，打印机</p>' % index)
+            for index in range(count)]
+
+
+class FailingConverter(plugin.UltraConverter):
+    """Fails on files holding BROKEN"""
+
+    def process(self, data):
+        if 'BROKEN' in data:
+            raise ValueError('cannot convert BROKEN')
+        return super().process(data)
+
+
+class ConvertBookTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.processor = FailingConverter({})
+
+    def convert(self, files, **kwargs):
+        book = FakeContainer(files)
+        with redirect_stdout(io.StringIO()) as out, redirect_stderr(io.StringIO()) as err:
+            plugin.convert_book(book, self.processor, **kwargs)
+        return book, out.getvalue() + err.getvalue()
+
+    @unittest.skipUnless(plugin._can_fork(), 'needs fork')
+    def test_parallel_equals_serial(self):
+        files = make_files(12)
+        serial, _ = self.convert(files, workers=1)
+        parallel, _ = self.convert(files, workers=3)
+        self.assertEqual(parallel.written, serial.written)
+        self.assertEqual(len(serial.written), 12)
+        self.assertEqual(serial.written['c03'], '<p>「第3章」 頭髮乾燥，印表機</p>')
+
+    def test_failing_file_is_isolated(self):
+        files = make_files(6)
+        files[2] = ('c02', '<p>BROKEN</p>')
+        for workers in ([1, 3] if plugin._can_fork() else [1]):
+            book, log = self.convert(files, workers=workers)
+            self.assertEqual(sorted(book.written), ['c00', 'c01', 'c03', 'c04', 'c05'])
+            self.assertIn('c02 (Text/c02.xhtml)', log)
+            # The traceback reaches back into the converter, also from a worker
+            self.assertIn('Traceback', log)
+            self.assertIn('cannot convert BROKEN', log)
+            self.assertIn('in process', log)
+
+    def test_serial_where_fork_is_unsafe(self):
+        files = make_files(4)
+        # macOS can fork but it is unsafe there; Windows can only spawn
+        for platform, methods in (('darwin', ['spawn', 'fork', 'forkserver']), ('win32', ['spawn'])):
+            with mock.patch.object(plugin.sys, 'platform', platform), \
+                    mock.patch.object(plugin.multiprocessing, 'get_all_start_methods', return_value=methods), \
+                    mock.patch.object(plugin, '_make_executor', side_effect=AssertionError) as pool:
+                book, log = self.convert(files, workers=4)
+            pool.assert_not_called()
+            self.assertEqual(len(book.written), 4)
+            self.assertNotIn('Traceback', log)
+
+
+class RecordingConverter(plugin.UltraConverter):
+    """Records the files it converts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.converted = []
+
+    def process(self, data):
+        self.converted.append(data)
+        return super().process(data)
+
+
+class ConversionCacheTest(unittest.TestCase):
+
+    files = [('hair', '<p>头发干燥</p>'), ('hair_t', '<p>頭髮乾燥</p>'),
+             ('printer', '<p>打印机</p>'), ('plain', '<p>今天天气很好</p>')]
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp)
+
+    def run_book(self, custom, mode='s2twp'):
+        """Converts the files through a cache in self.temp, as plugin.run does"""
+        processor = RecordingConverter(custom, mode)
+        cache = plugin.ConversionCache(self.temp, mode, custom)
+        book = FakeContainer(self.files)
+        plugin.convert_book(book, processor, workers=1, cache=cache)
+        cache.save()
+        fids = dict((data, fid) for fid, data in self.files)
+        return sorted(fids[data] for data in processor.converted), book.written
+
+    def test_rerun_hits_every_file(self):
+        custom = final_dict('头发\t秀髮', '打印机\t列印機')
+        converted, written = self.run_book(custom)
+        self.assertEqual(converted, ['hair', 'hair_t', 'plain', 'printer'])
+        converted, rerun = self.run_book(dict(custom))
+        self.assertEqual(converted, [])
+        self.assertEqual(rerun, written)
+
+    def test_edited_entry_recomputes_files_with_its_key(self):
+        self.run_book(final_dict('头发\t秀髮', '打印机\t列印機'))
+        # The key is found in the text in either script
+        converted, written = self.run_book(final_dict('头发\t毛髮', '打印机\t列印機'))
+        self.assertEqual(converted, ['hair', 'hair_t'])
+        self.assertEqual(written['hair'], '<p>毛髮乾燥</p>')
+        self.assertEqual(written['printer'], '<p>列印機</p>')
+        # An added entry counts as edited
+        converted, written = self.run_book(final_dict('头发\t毛髮', '打印机\t列印機', '天气\t天候'))
+        self.assertEqual(converted, ['plain'])
+        self.assertEqual(written['plain'], '<p>今天天候很好</p>')
+        # So does a removed one
+        converted, written = self.run_book(final_dict('头发\t毛髮', '天气\t天候'))
+        self.assertEqual(converted, ['printer'])
+        self.assertEqual(written['printer'], '<p>印表機</p>')
+
+    def test_invalidation(self):
+        custom = final_dict('头发\t秀髮')
+        self.run_book(custom)
+        # Another conversion mode
+        converted, _ = self.run_book(custom, mode='s2t')
+        self.assertEqual(len(converted), 4)
+        # A compiled dictionary records no entries to compare
+        ocb_dir = os.path.join(self.temp, 'ocb')
+        with mock.patch.object(plugin, 'LARGE_DICT_ENTRIES', 0):
+            path = plugin.custom_dict_source(custom, ocb_dir)
+            converted, _ = self.run_book(path)
+            self.assertEqual(len(converted), 4)
+            self.assertEqual(self.run_book(path)[0], [])
+            # Its name changes with its content
+            path = plugin.custom_dict_source(final_dict('头发\t毛髮'), ocb_dir)
+            converted, written = self.run_book(path)
+        self.assertEqual(len(converted), 4)
+        self.assertEqual(written['hair'], '<p>毛髮乾燥</p>')
+        # A changed builtin dictionary changes the base fingerprint
+        self.run_book(custom)
+        with mock.patch.object(plugin.ConversionCache, 'base_fingerprint', return_value='changed'):
+            converted, _ = self.run_book(custom)
+        self.assertEqual(len(converted), 4)
+
+
+class LargeDictTest(unittest.TestCase):
+
+    def test_large_files_are_streamed(self):
+        # Large files skip the parse into memory but give the same custom dictionary
+        temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp)
+        lines = {'a.txt': ['头发\t頭髮', '干燥\t乾燥', '没有分隔', '头 发\tX', '打印机\t印表機'] * 30,
+                 'b.txt': ['头发\t毛髮', '软件\t軟體'],
+                 'c.txt': ['干燥\t乾躁', '鼠标\t滑鼠'] * 40}
+        spec = []
+        for name in sorted(lines):
+            path = os.path.join(temp, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines[name]) + '\n')
+            spec.append((name, path, None))
+        expected = plugin.prepare_conversion(spec, cache_dir=temp)
+        with mock.patch.object(plugin, 'LARGE_FILE_BYTES', 200), \
+                mock.patch.object(plugin, 'LARGE_FILE_BATCH_LINES', 7):
+            prepared = plugin.prepare_conversion(spec, cache_dir=temp)
+        self.assertEqual([parsed.name for parsed in prepared.sources], ['b.txt'])
+        self.assertEqual(dict(ocd.load(prepared.final_dict)[2].items()), expected.final_dict)
+        text = '干燥的头发用打印机和鼠标'
+        self.assertEqual(prepared.processor.process(text), expected.processor.process(text))
+
+
+class PreloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp)
+        self.path = os.path.join(self.temp, 'custom.txt')
+        self.write('头发\t秀髮\n')
+
+    def write(self, text):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def wait_prepared(self, preloader):
+        with preloader._cond:
+            while preloader._result is None:
+                preloader._cond.wait()
+
+    def test_take_prepared_result(self):
+        spec = [('custom.txt', self.path, None)]
+        preloader = plugin.Preloader()
+        preloader.submit(spec)
+        self.wait_prepared(preloader)
+        with mock.patch.object(plugin, 'prepare_conversion', side_effect=AssertionError):
+            prepared = preloader.take(spec)
+        self.assertEqual(prepared.processor.process('<p>头发</p>'), '<p>秀髮</p>')
+        # The background thread is done before the workers are forked
+        self.assertFalse(preloader._thread.is_alive())
+
+    def test_take_other_spec(self):
+        other = os.path.join(self.temp, 'other.txt')
+        with open(other, 'w', encoding='utf-8') as f:
+            f.write('头发\t毛髮\n')
+        preloader = plugin.Preloader()
+        preloader.submit([('custom.txt', self.path, None), ('other.txt', other, None)])
+        preloader.submit([('other.txt', other, None)])
+        # The dictionaries checked when the manager closes win, and text
+        # being edited is taken over the file
+        prepared = preloader.take([('custom.txt', self.path, '头发\t長髮\n')])
+        self.assertEqual(prepared.processor.process('<p>头发</p>'), '<p>長髮</p>')
+
+    def test_failure_is_raised(self):
+        with mock.patch.object(plugin, 'prepare_conversion', side_effect=ValueError('broken')):
+            preloader = plugin.Preloader()
+            with self.assertRaisesRegex(ValueError, 'broken'):
+                preloader.take([('custom.txt', self.path, None)])
+
+    def test_file_saved_after_preparing(self):
+        # A paged dictionary is saved after the background thread prepared
+        # it, with the same spec
+        spec = [('custom.txt', self.path, None)]
+        preloader = plugin.Preloader()
+        preloader.submit(spec)
+        self.wait_prepared(preloader)
+        self.write('头发\t毛髮\n')
+        prepared = preloader.take(spec)
+        self.assertEqual(prepared.processor.process('<p>头发</p>'), '<p>毛髮</p>')
+
+
+
+class PagedDictFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp)
+        self.path = os.path.join(self.temp, 'large.txt')
+
+    def write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_pages(self):
+        lines = ['词%d\t詞%d\n' % (i, i) for i in range(25)]
+        self.write(''.join(lines).encode('utf-8'))
+        paged = plugin.PagedDictFile(self.path, page_lines=10)
+        self.assertEqual(paged.page_count(), 3)
+        self.assertEqual([paged.read_page(page) for page in range(3)],
+                         [''.join(lines[:10]), ''.join(lines[10:20]), ''.join(lines[20:])])
+        # No empty page after a full last one, or for a last line without newline
+        for data in (''.join(lines[:20]), ''.join(lines[:20]) + '尾\t尾'):
+            self.write(data.encode('utf-8'))
+            paged = plugin.PagedDictFile(self.path, page_lines=10)
+            self.assertEqual(''.join(paged.read_page(page) for page in range(paged.page_count())), data)
+            self.assertEqual(paged.page_count(), 2 if data.endswith('\n') else 3)
+
+    def test_save(self):
+        # Pages left alone are copied byte for byte, line endings included
+        original = ''.join('词%d\t詞%d\r\n' % (i, i) for i in range(25)).encode('utf-8')
+        self.write(original)
+        paged = plugin.PagedDictFile(self.path, page_lines=10)
+        middle = paged.read_page(1)
+        # The text widget drops the final newline: not an edit
+        paged.set_page(1, middle.rstrip('\n'))
+        self.assertEqual(paged.edits, {})
+        paged.save()
+        self.assertEqual(self.read(), original)
+
+        paged.set_page(1, '新\t新\n加\t加')
+        paged.set_page(2, '')
+        self.assertEqual(paged.read_page(1), '新\t新\n加\t加')
+        paged.save()
+        first = original.split(b'\n')[:10]
+        self.assertEqual(self.read(), b'\n'.join(first) + '\n新\t新\n加\t加\n'.encode('utf-8'))
+        # Pages are counted again after saving
+        self.assertEqual(paged.page_count(), 2)
+        self.assertEqual(paged.read_page(1), '新\t新\n加\t加\n')
+        self.assertEqual(paged.edits, {})
+
+    def test_round_trip(self):
+        lines = ['词%d\t詞%d\n' % (i, i) for i in range(23)]
+        self.write(''.join(lines).encode('utf-8'))
+        paged = plugin.PagedDictFile(self.path, page_lines=5)
+        # Every page set to what it shows, as the editor does on save
+        for page in range(paged.page_count()):
+            paged.set_page(page, paged.read_page(page))
+        paged.save()
+        self.assertEqual(self.read(), ''.join(lines).encode('utf-8'))
+        # The saved file parses as the edits made it
+        paged.set_page(4, '头发\t秀髮\n')
+        paged.save()
+        with open(self.path, encoding='utf-8') as f:
+            entries, errors = plugin.parse_dict_text(f.read())
+        self.assertEqual(errors, [])
+        self.assertEqual([key for _, key, _ in entries], ['词%d' % i for i in range(20)] + ['头发'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# DictRegistry
+#
+# Parsed dictionaries and compiled groups are shared between converters,
+# reloaded once their file changes and evicted least recently used first.
+##########################################################
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from opencc import OpenCC
+from opencc.opencc import DictRegistry
+
+
+class DictRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp)
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.temp, name)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_reuse(self):
+        path = self.write('a.txt', '头\t頭\n头发\t頭髮\n')
+        registry = DictRegistry()
+        entry = registry.get_dict(path)
+        self.assertEqual(entry, (2, 1, {'头': '頭', '头发': '頭髮'}))
+        self.assertIs(registry.get_dict(path), entry)
+        self.assertIs(registry.get_group([path]), registry.get_group([path]))
+        # Converters built from the same registry share its tables
+        first = OpenCC('s2t', registry=registry)
+        second = OpenCC('s2t', registry=registry)
+        self.assertEqual(first.convert('头发'), second.convert('头发'))
+        self.assertIs(first._dict_chain_data[0].load(), second._dict_chain_data[0].load())
+
+    def test_mtime_invalidation(self):
+        path = self.write('a.txt', '头\t頭\n', mtime=1000000000)
+        other = self.write('b.txt', '发\t髮\n', mtime=1000000000)
+        registry = DictRegistry()
+        entry = registry.get_dict(path)
+        group = registry.get_group([path, other])
+        kept = registry.get_dict(other)
+        self.write('a.txt', '头\t首\n', mtime=1000000100)
+        self.assertEqual(registry.get_dict(path)[2], {'头': '首'})
+        self.assertIsNot(registry.get_dict(path), entry)
+        # The groups using the file are rebuilt, the other file is kept
+        self.assertIsNot(registry.get_group([path, other]), group)
+        self.assertEqual(registry.get_group([path, other]).convert('头发'), '首髮')
+        self.assertIs(registry.get_dict(other), kept)
+        # Stale entries are dropped instead of piling up
+        self.assertEqual(len([key for key in registry._entries
+                              if key[0] == 'dict' and key[1][0] == os.path.abspath(path)]), 1)
+
+    def test_lru_eviction(self):
+        paths = [self.write('%d.txt' % i, ''.join('%s%d\tx\n' % (char, i) for char in 'abcde'))
+                 for i in range(3)]
+        registry = DictRegistry(max_entries=12)
+        first = registry.get_dict(paths[0])
+        registry.get_dict(paths[1])
+        # Using the first file makes the second the least recently used
+        self.assertIs(registry.get_dict(paths[0]), first)
+        registry.get_dict(paths[2])
+        self.assertEqual(registry.size, 10)
+        self.assertIs(registry.get_dict(paths[0]), first)
+        self.assertEqual(sorted(key[1][0] for key in registry._entries),
+                         sorted(os.path.abspath(path) for path in (paths[0], paths[2])))
+        # The newest entry is kept even alone over the bound
+        registry.set_max_entries(1)
+        self.assertEqual(len(registry._entries), 1)
+        self.assertIs(registry.get_dict(paths[0]), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
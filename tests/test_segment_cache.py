@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import (unicode_literals, division, absolute_import,
+                        print_function)
+##########################################################
+# Conversion through a SegmentCache against converting without one
+#
+# Cached segments must convert as they would without the cache, also after
+# the custom dictionaries change, and the cache has to stay in its bounds.
+##########################################################
+
+import random
+import unittest
+
+from opencc import OpenCC
+from opencc.opencc import SegmentCache
+from test_dict_group import CONFIGS, mixed_corpus
+
+
+class SegmentCacheTest(unittest.TestCase):
+
+    def test_bundled_configs(self):
+        cache = SegmentCache(max_entries=500)
+        for config in CONFIGS:
+            cc = OpenCC(config)
+            cached = OpenCC(config, segment_cache=cache)
+            text = mixed_corpus(cc, random.Random(config))
+            expected = cc.convert(text)
+            # The second pass converts from the cache
+            self.assertEqual(cached.convert(text), expected, config)
+            hits = cache.hits
+            self.assertEqual(cached.convert(text), expected, config)
+            self.assertGreater(cache.hits, hits)
+            self.assertLessEqual(cache.stats()['entries'], 500)
+
+    def test_custom_dicts_change(self):
+        cache = SegmentCache()
+        cc = OpenCC('s2t', segment_cache=cache)
+        self.assertEqual(cc.convert('头发，头发'), '頭髮，頭髮')
+        cc.set_custom_dicts([{'头发': '秀髮'}])
+        self.assertEqual(cc.convert('头发，头发'), '秀髮，秀髮')
+        # Converters sharing the cache do not see each other's segments
+        self.assertEqual(OpenCC('s2t', segment_cache=cache).convert('头发'), '頭髮')
+        self.assertEqual(OpenCC('s2tw', segment_cache=cache).convert('打印机'), '打印機')
+
+
+if __name__ == '__main__':
+    unittest.main()